@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Benchmark bcrypt on this machine and suggest BCRYPT_ROUNDS for a latency target.
+Each extra round doubles the cost, so the suggestion is the highest cost whose
+median single-hash time stays under the target. Run it on the production host:
+    python "Cleanup-Maintenance Scripts/calibrate_bcrypt.py" --target-ms 250
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from auth_bcrypt import hash_password
+
+
+def time_rounds(rounds, samples):
+    """Median milliseconds for one bcrypt hash at this cost"""
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        hash_password('calibration-password-1', rounds)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--target-ms', type=float, default=250, help='latency budget per hash')
+    parser.add_argument('--samples', type=int, default=3, help='hashes timed per cost')
+    parser.add_argument('--min-rounds', type=int, default=10, help='lowest cost to accept')
+    args = parser.parse_args()
+
+    print(f"⏱️  bcrypt cost vs. latency (target {args.target_ms:.0f} ms)")
+    chosen = None
+    for rounds in range(4, 32):
+        ms = time_rounds(rounds, args.samples)
+        print(f"   rounds={rounds:2d}  {ms:8.1f} ms")
+        if ms > args.target_ms:
+            break
+        chosen = rounds
+
+    if chosen is None or chosen < args.min_rounds:
+        print(f"⚠️  No cost >= {args.min_rounds} fits {args.target_ms:.0f} ms; "
+              f"use BCRYPT_ROUNDS={args.min_rounds} and more PASSWORD_POOL_WORKERS")
+    else:
+        print(f"✅ Suggested: BCRYPT_ROUNDS={chosen}")
+    print(f"   Pool capacity ~= PASSWORD_POOL_WORKERS ({os.cpu_count()} CPUs here) x 1000 / hash ms per second")
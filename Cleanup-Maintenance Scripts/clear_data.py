@@ -1,5 +1,6 @@
 import os
 import json
+import shutil
 
 def clear_all_data():
     """Clear all JSON database files"""
@@ -15,6 +16,12 @@ def clear_all_data():
                 json.dump([], f)
             print(f'✓ Cleared {filename}')
     
+    # Carts are stored per user in data/carts/
+    carts_dir = os.path.join('data', 'carts')
+    if os.path.exists(carts_dir):
+        shutil.rmtree(carts_dir)
+        print('✓ Cleared carts/')
+    
     print('\n✓ All data cleared successfully!')
     print('Run "python seed_data.py" to regenerate test data.')
 
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""
+Retention job: drop change log entries older than CHANGE_LOG_RETENTION (or --days).
+Schedule it daily (e.g. cron) from the project root:
+    python "Cleanup-Maintenance Scripts/compact_change_log.py" --days 30
+"""
+
+import argparse
+import os
+import sys
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from change_log import compact_change_log, first_seq
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--days', type=int, help='keep entries this many days (default: CHANGE_LOG_RETENTION)')
+    args = parser.parse_args()
+
+    retention = timedelta(days=args.days) if args.days else None
+    print("🔄 Compacting change log...")
+    kept, dropped = compact_change_log(retention)
+    print(f"   kept: {kept}, dropped: {dropped}")
+    print(f"✅ Oldest available change: {first_seq()}")
@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+"""
+Repair job: recompute the materialized /api/stats counters from the data files.
+Run it from the project root after editing data files by hand:
+    python "Cleanup-Maintenance Scripts/rebuild_stats.py"
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stats_store import rebuild_stats, COUNTERS
+
+if __name__ == "__main__":
+    print("🔄 Rebuilding dashboard counters...")
+    stats = rebuild_stats()
+    for name in COUNTERS:
+        print(f"   {name}: {stats[name]}")
+    print(f"✅ Counters rebuilt at {stats['rebuilt_at']}")
@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+"""
+Nightly job: rebuild the co-purchase model and every user's recommendation list.
+Schedule it from the project root, e.g. with cron:
+    0 3 * * * cd /path/to/app && python "Cleanup-Maintenance Scripts/refresh_recommendations.py"
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recommendations import rebuild_copurchase, refresh_all_user_recommendations
+
+if __name__ == "__main__":
+    print("🔄 Rebuilding co-purchase model...")
+    model = rebuild_copurchase()
+    print(f"   ✅ {len(model['top'])} products with co-purchase neighbours")
+
+    print("🔄 Refreshing user recommendation lists...")
+    recs = refresh_all_user_recommendations()
+    print(f"   ✅ {len(recs['users'])} users refreshed at {recs['generated_at']}")
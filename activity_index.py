@@ -0,0 +1,137 @@
+"""
+Per-user activity timeline
+Orders, reviews, likes and wishlist adds are indexed per user as lists sorted
+by (created_at, type, id, action), built once per data file version; cart
+additions/updates come from the user's own cart file. A timeline page is a
+lazy k-way merge (heapq.merge) of those streams, newest first, each started
+with a bisect at the cursor, so paging through a heavy user's history only
+touches the entries on the page.
+"""
+
+import base64
+import heapq
+import json
+from bisect import bisect_left
+from itertools import islice
+
+from cart_store import load_cart
+from order_store import order_summary
+from utils import load_json_cached
+
+TYPES = ('order', 'review', 'like', 'wishlist', 'cart')
+
+
+def _project_review(review):
+    return {'product_id': review['product_id'], 'rating': review['rating'], 'comment': review.get('comment', '')}
+
+
+def _project_product(record):
+    return {'product_id': record['product_id']}
+
+
+def _user_streams(records, kind, project):
+    """{user_id: (sorted keys, entries)} for one data file"""
+    streams = {}
+    for record in records:
+        key = (record.get('created_at') or '', kind, record['id'], 'created')
+        streams.setdefault(record['user_id'], []).append((key, project(record)))
+    result = {}
+    for user_id, entries in streams.items():
+        entries.sort(key=lambda entry: entry[0])
+        result[user_id] = ([key for key, _ in entries], [data for _, data in entries])
+    return result
+
+
+def _decode_orders(records):
+    return _user_streams(records, 'order', order_summary)
+
+
+def _decode_reviews(records):
+    return _user_streams(records, 'review', _project_review)
+
+
+def _decode_likes(records):
+    return _user_streams(records, 'like', _project_product)
+
+
+def _decode_wishlist(records):
+    return _user_streams(records, 'wishlist', _project_product)
+
+
+# type -> (data file, decoder); the decoders double as load_json_cached keys
+SOURCES = {
+    'order': ('orders.json', _decode_orders),
+    'review': ('reviews.json', _decode_reviews),
+    'like': ('likes.json', _decode_likes),
+    'wishlist': ('wishlist.json', _decode_wishlist)
+}
+
+_EMPTY = ([], [])
+
+
+def _stream(user_id, kind):
+    if kind == 'cart':
+        entries = []
+        for line in load_cart(user_id).values():
+            data = {'product_id': line['product_id'], 'quantity': line['quantity']}
+            entries.append(((line['created_at'], 'cart', line['id'], 'added'), data))
+            if line.get('updated_at'):
+                entries.append(((line['updated_at'], 'cart', line['id'], 'updated'), data))
+        entries.sort(key=lambda entry: entry[0])
+        return [key for key, _ in entries], [data for _, data in entries]
+    filename, decode = SOURCES[kind]
+    return load_json_cached(filename, decode).get(user_id, _EMPTY)
+
+
+def _newest_first(keys, entries, before):
+    """Entries of one stream older than the cursor, newest first"""
+    end = bisect_left(keys, before) if before else len(keys)
+    for i in range(end - 1, -1, -1):
+        yield keys[i], entries[i]
+
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Timeline key from a cursor; raises ValueError if it is malformed"""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, UnicodeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(key, list) or [type(part) for part in key] != [str, str, int, str]:
+        raise ValueError('Invalid cursor')
+    return tuple(key)
+
+
+def user_timeline(user_id, before=None, limit=20, types=TYPES):
+    """One page of a user's activity, newest first: (entries, cursor of the next page or None)"""
+    streams = []
+    for kind in types:
+        keys, entries = _stream(user_id, kind)
+        streams.append(_newest_first(keys, entries, before))
+    page = list(islice(heapq.merge(*streams, key=lambda entry: entry[0], reverse=True), limit + 1))
+
+    timeline = [{
+        'type': kind,
+        'id': record_id,
+        'action': action,
+        'created_at': created_at,
+        'data': data
+    } for (created_at, kind, record_id, action), data in page[:limit]]
+    next_cursor = encode_cursor(page[limit - 1][0]) if len(page) > limit else None
+    return timeline, next_cursor
+
+
+def user_activity_summary(user_id):
+    """Per-type counts and total spent (non-cancelled orders)"""
+    orders = _stream(user_id, 'order')[1]
+    return {
+        'total_orders': len(orders),
+        'total_reviews': len(_stream(user_id, 'review')[0]),
+        'total_likes': len(_stream(user_id, 'like')[0]),
+        'wishlist_items': len(_stream(user_id, 'wishlist')[0]),
+        'cart_items': len(load_cart(user_id)),
+        'total_spent': round(sum(o['total_amount'] for o in orders if o['status'] != 'cancelled'), 2)
+    }
@@ -0,0 +1,161 @@
+"""
+Columnar analytics over orders
+orders.json is turned into NumPy columns once per file version: one row per
+order (timestamp, total, status, user, item quantity) and one row per order
+line (order row, product, quantity, subtotal). Ad-hoc reports are then a
+boolean filter mask plus a vectorized group-by (np.unique + np.bincount)
+instead of a Python loop over every order.
+
+Order-level groupings use the order total as revenue; product and category
+groupings use line subtotals.
+"""
+
+import numpy as np
+
+from order_store import order_timestamp
+from utils import load_json_cached, build_lookup
+
+ORDER_GROUPS = ('status', 'user', 'hour', 'weekday', 'day', 'month')
+ITEM_GROUPS = ('product', 'category')
+GROUPS = (None,) + ORDER_GROUPS + ITEM_GROUPS
+SORT_FIELDS = ('key', 'revenue', 'orders', 'quantity')
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+def _build_columns(orders):
+    """Columnar arrays for every order and order line"""
+    statuses = sorted({o['status'] for o in orders})
+    status_code = {status: i for i, status in enumerate(statuses)}
+
+    item_order, item_product, item_quantity, item_subtotal = [], [], [], []
+    for row, order in enumerate(orders):
+        for item in order.get('items', []):
+            item_order.append(row)
+            item_product.append(item['product_id'])
+            item_quantity.append(item['quantity'])
+            item_subtotal.append(item.get('subtotal', item['price'] * item['quantity']))
+
+    item_order = np.array(item_order, dtype=np.int64)
+    item_quantity = np.array(item_quantity, dtype=np.int64)
+    return {
+        'statuses': statuses,
+        'order_id': np.array([o['id'] for o in orders], dtype=np.int64),
+        'user_id': np.array([o['user_id'] for o in orders], dtype=np.int64),
+        'ts': np.array([o.get('created_ts') or order_timestamp(o['created_at']) for o in orders], dtype=np.float64),
+        'total': np.array([o['total_amount'] for o in orders], dtype=np.float64),
+        'status': np.array([status_code[o['status']] for o in orders], dtype=np.int64),
+        'quantity': np.bincount(item_order, weights=item_quantity, minlength=len(orders)).astype(np.int64),
+        'item_order': item_order,
+        'item_product': np.array(item_product, dtype=np.int64),
+        'item_quantity': item_quantity,
+        'item_subtotal': np.array(item_subtotal, dtype=np.float64)
+    }
+
+
+def order_columns():
+    """Columns for the current orders.json (shared, read-only)"""
+    return load_json_cached('orders.json', _build_columns)
+
+
+def _order_mask(columns, start_ts, end_ts, statuses, exclude_statuses):
+    mask = np.ones(len(columns['ts']), dtype=bool)
+    if start_ts is not None:
+        mask &= columns['ts'] >= start_ts
+    if end_ts is not None:
+        mask &= columns['ts'] < end_ts
+    if statuses is not None:
+        codes = [i for i, status in enumerate(columns['statuses']) if status in statuses]
+        mask &= np.isin(columns['status'], codes)
+    if exclude_statuses:
+        codes = [i for i, status in enumerate(columns['statuses']) if status in exclude_statuses]
+        mask &= ~np.isin(columns['status'], codes)
+    return mask
+
+
+def _order_keys(columns, group_by):
+    """Group key per order row, plus a function turning a key into its label"""
+    ts = columns['ts']
+    if group_by == 'status':
+        return columns['status'], lambda k: columns['statuses'][k]
+    if group_by == 'user':
+        return columns['user_id'], int
+    if group_by == 'hour':
+        return (ts // 3600 % 24).astype(np.int64), int
+    if group_by == 'weekday':
+        # 1970-01-01 was a Thursday (Monday = 0)
+        return ((ts // 86400 + 3) % 7).astype(np.int64), lambda k: WEEKDAYS[k]
+    unit = 'D' if group_by == 'day' else 'M'
+    periods = ts.astype('datetime64[s]').astype(f'datetime64[{unit}]').astype(np.int64)
+    return periods, lambda k: str(np.datetime64(int(k), unit))
+
+
+def _category_keys(products):
+    """Category code per product id, plus the category names"""
+    categories = sorted({p.get('category', '') for p in products.values()})
+    codes = {category: i for i, category in enumerate(categories)}
+    return {pid: codes[p.get('category', '')] for pid, p in products.items()}, categories
+
+
+def run_query(group_by=None, start_ts=None, end_ts=None, statuses=None, exclude_statuses=None,
+              sort='revenue', limit=None):
+    """Revenue, order count and quantity, optionally grouped
+
+    start_ts/end_ts are epoch seconds ([start, end)); statuses is a set of
+    order statuses to include (None = all) and exclude_statuses a set to
+    leave out. Returns (rows, totals).
+    """
+    columns = order_columns()
+    mask = _order_mask(columns, start_ts, end_ts, statuses, exclude_statuses)
+    totals = {
+        'revenue': round(float(columns['total'][mask].sum()), 2),
+        'orders': int(mask.sum()),
+        'quantity': int(columns['quantity'][mask].sum())
+    }
+    if group_by is None:
+        return [], totals
+
+    if group_by in ORDER_GROUPS:
+        keys, label = _order_keys(columns, group_by)
+        keys = keys[mask]
+        order_rows = np.flatnonzero(mask)
+        revenue_weights = columns['total'][mask]
+        quantity_weights = columns['quantity'][mask]
+    else:
+        item_mask = mask[columns['item_order']]
+        keys = columns['item_product'][item_mask]
+        order_rows = columns['item_order'][item_mask]
+        revenue_weights = columns['item_subtotal'][item_mask]
+        quantity_weights = columns['item_quantity'][item_mask]
+        products = load_json_cached('products.json', build_lookup)
+        if group_by == 'category':
+            category_of, categories = _category_keys(products)
+            # Map each distinct product once; lines of deleted products get -1 ("unknown")
+            product_ids, product_rows = np.unique(keys, return_inverse=True)
+            codes = np.array([category_of.get(pid, -1) for pid in product_ids.tolist()], dtype=np.int64)
+            keys = codes[product_rows]
+            label = lambda k: categories[k] if k >= 0 else None
+        else:
+            label = int
+
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    revenue = np.bincount(inverse, weights=revenue_weights, minlength=len(unique_keys))
+    quantity = np.bincount(inverse, weights=quantity_weights, minlength=len(unique_keys))
+    # Distinct orders per group (an order can have several lines in one group)
+    distinct = np.unique(np.stack([inverse, order_rows]), axis=1)[0] if len(inverse) else inverse
+    orders = np.bincount(distinct, minlength=len(unique_keys))
+
+    rows = [{
+        'key': label(key),
+        'revenue': round(float(revenue[i]), 2),
+        'orders': int(orders[i]),
+        'quantity': int(quantity[i])
+    } for i, key in enumerate(unique_keys.tolist())]
+
+    if group_by == 'product':
+        for row in rows:
+            product = products.get(row['key'])
+            row['name'] = product['name'] if product else None
+
+    if sort != 'key':
+        rows.sort(key=lambda r: r[sort], reverse=True)
+    return rows[:limit] if limit else rows, totals
@@ -1,15 +1,34 @@
 from flask import Flask, jsonify, request
 from flask_cors import CORS
-from functools import wraps
 import json
 import os
 import re
 from datetime import datetime, timedelta
-from auth import generate_token, generate_refresh_token, verify_token, hash_password, verify_password
-from utils import load_json, save_json, get_next_id, validate_email, apply_price_fail, cleanup_user_data
+from auth import generate_token, generate_refresh_token, verify_token
+from password_hashing import hash_password, verify_password, hash_info, needs_rehash, PasswordHasherBusy
+from user_store import get_user_by_id, get_user_by_email, find_user_position, load_users, save_users, public_user
+from revocation import is_revoked, revoke_token
+from rate_limit import rate_limited
+from stats_store import adjust_stats, rebuild_stats, get_stats_counters, is_low_stock, stock_number
+from event_counters import record_event, record_visitor
+from stock_index import low_stock_ids, rebuild_stock_index
+from activity_index import TYPES as ACTIVITY_TYPES, user_timeline, user_activity_summary, decode_cursor
+from auth_decorators import token_required, admin_required, verify_token_cached
+from utils import load_json, save_json, load_json_cached, file_lock, locked, get_next_id, build_index, build_lookup, validate_email, validate_stock, validate_id, apply_price_fail, cleanup_user_data
+from cart_store import load_cart, save_cart, delete_cart, find_cart_line, next_cart_line_id, migrate_legacy_cart
+from inventory import reserve_stock, commit_reservation, release_reservation, restock_order
+from idempotency import idempotent
+from order_store import (orders_between, order_timestamp, backfill_order_timestamps, rebuild_order_indexes,
+                         index_order, order_ids_with_status, order_status_counts, order_summaries, order_summary_map)
 from config import Config
 from flask import Flask, jsonify, request, render_template, redirect, url_for, session, flash
 from extended_api import register_extended_routes
+from tasks import emit, start_task_recovery
+from change_log import record_change, record_changes, changes_since, first_seq
+import order_events  # registers background handlers for order events
+import inventory_events  # registers background handlers for stock alerts
+import product_events  # registers background handlers for product deletions
+import user_events  # registers background handlers for password rehashes
 
 
 app = Flask(__name__)
@@ -27,7 +46,6 @@ def init_data_files():
         'users.json': [],
         'products.json': [],
         'orders.json': [],
-        'cart.json': [],
         'categories.json': [
             {"id": 1, "name": "Electronics", "description": "Electronic devices and accessories"},
             {"id": 2, "name": "Clothing", "description": "Fashion and apparel"},
@@ -60,37 +78,35 @@ def init_data_files():
 
 init_data_files()
 
+# Carts used to be one global cart.json list; move them to per-user files
+migrate_legacy_cart()
+
+# Orders carry a numeric created_ts used by date-range queries
+backfill_order_timestamps()
+
+# Catch up with any offline edits to the data files (seed/maintenance scripts)
+rebuild_order_indexes()
+rebuild_stats()
+rebuild_stock_index()
+
+# Re-run background jobs a crashed worker left in the task queue (now and periodically)
+start_task_recovery()
+
 # Register extended API routes
 register_extended_routes(app)
 
-# Authentication decorator
-def token_required(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        
-        if not token:
-            return jsonify({'success': False, 'error': 'Token is missing'}), 401
-        
-        if token.startswith('Bearer '):
-            token = token[7:]
-        
-        user_data = verify_token(token)
-        if not user_data:
-            return jsonify({'success': False, 'error': 'Token is invalid or expired'}), 401
-        
-        return f(user_data, *args, **kwargs)
-    
-    return decorated
-
-# Admin check decorator
-def admin_required(f):
-    @wraps(f)
-    def decorated(user_data, *args, **kwargs):
-        if not user_data.get('is_admin', False):
-            return jsonify({'success': False, 'error': 'Admin privileges required'}), 403
-        return f(user_data, *args, **kwargs)
-    return decorated
+# ============== VISITOR TRACKING ==============
+@app.before_request
+def track_visitor():
+    """Count the client towards today's unique visitors (HyperLogLog, flushed in the background)"""
+    if request.method == 'OPTIONS' or request.path.startswith('/static/'):
+        return
+    header = request.headers.get('Authorization', '')
+    payload = verify_token_cached(header[7:]) if header.startswith('Bearer ') else None
+    if payload:
+        record_visitor(f"user:{payload['id']}")
+    else:
+        record_visitor(f"anon:{request.remote_addr}:{request.headers.get('User-Agent', '')}")
 
 # ============== HEALTH CHECK ==============
 @app.route('/api/health', methods=['GET'])
@@ -105,6 +121,7 @@ def health_check():
 
 # ============== USER MANAGEMENT ==============
 @app.route('/api/register', methods=['POST'])
+@rate_limited('register')
 def register():
     """Register a new user"""
     data = request.get_json()
@@ -145,28 +162,39 @@ def register():
     if not address or not str(address).strip():
         return jsonify({'success': False, 'error': 'Address is required'}), 400
     
-    users = load_json('users.json')
-    
-    # Check if user already exists
-    if any(u['email'] == data['email'] for u in users):
+    # Check if user already exists (emails are case-insensitive)
+    if get_user_by_email(data['email']):
         return jsonify({'success': False, 'error': 'User already exists'}), 409
     
-    new_user = {
-        'id': get_next_id(users),
-        'email': data['email'],
-        'password': hash_password(data['password']),
-        'name': data.get('name', ''),
-        'phone': data.get('phone', ''),
-        'address': data.get('address', ''),
-        'is_admin': False,  # SECURITY FIX: Always false on registration, admin must be set manually
-        'created_at': datetime.now().isoformat()
-    }
+    # Hash before taking the lock so the slow part isn't inside the read-modify-write
+    password_hash = hash_password(data['password'])
     
-    users.append(new_user)
-    save_json('users.json', users)
+    with file_lock('users.json'):
+        # Re-check: someone may have registered the address while we were hashing
+        if get_user_by_email(data['email']):
+            return jsonify({'success': False, 'error': 'User already exists'}), 409
+        
+        users = load_json('users.json')
+        password_algorithm, password_cost = hash_info(password_hash)
+        new_user = {
+            'id': get_next_id(users),
+            'email': data['email'],
+            'password': password_hash,
+            'password_algorithm': password_algorithm,
+            'password_cost': password_cost,
+            'name': data.get('name', ''),
+            'phone': data.get('phone', ''),
+            'address': data.get('address', ''),
+            'is_admin': False,  # SECURITY FIX: Always false on registration, admin must be set manually
+            'created_at': datetime.now().isoformat()
+        }
+        
+        users.append(new_user)
+        save_users(users, added=new_user)
+        adjust_stats(total_users=1)
     
-    # Remove password from response
-    user_response = {k: v for k, v in new_user.items() if k != 'password'}
+    # Remove password hash details from response
+    user_response = public_user(new_user)
     
     return jsonify({
         'success': True,
@@ -193,9 +221,11 @@ def refresh_token():
     if payload.get('type') != 'refresh':
         return jsonify({'success': False, 'error': 'Invalid token type'}), 401
     
+    if payload.get('jti') and is_revoked(payload['jti']):
+        return jsonify({'success': False, 'error': 'Refresh token has been revoked'}), 401
+    
     # Verify user still exists
-    users = load_json('users.json')
-    user = next((u for u in users if u['id'] == payload['id']), None)
+    user = get_user_by_id(payload['id'])
     
     if not user:
         return jsonify({'success': False, 'error': 'User not found'}), 404
@@ -210,6 +240,7 @@ def refresh_token():
     }), 200
 
 @app.route('/api/login', methods=['POST'])
+@rate_limited('login')
 def login():
     """User login"""
     data = request.get_json()
@@ -217,12 +248,17 @@ def login():
     if not data or not data.get('email') or not data.get('password'):
         return jsonify({'success': False, 'error': 'Email and password are required'}), 400
     
-    users = load_json('users.json')
-    user = next((u for u in users if u['email'] == data['email']), None)
+    user = get_user_by_email(data['email'])
     
     if not user or not verify_password(data['password'], user['password']):
         return jsonify({'success': False, 'error': 'Invalid credentials'}), 401
     
+    # Lazy migration to the current scheme/cost, off the request path; not
+    # journaled, since the payload holds the plain password
+    if needs_rehash(user['password']):
+        emit('user.rehash', {'user_id': user['id'], 'password': data['password'],
+                             'verified_hash': user['password']}, durable=False)
+    
     # Generate both access and refresh tokens
     access_token = generate_token(user['id'], user['email'], user.get('is_admin', False))
     refresh_token = generate_refresh_token(user['id'], user['email'])
@@ -240,6 +276,27 @@ def login():
         }
     }), 200
 
+@app.route('/api/logout', methods=['POST'])
+@token_required
+def logout(user_data):
+    """Revoke the current access token (and the refresh token, if sent)"""
+    data = request.get_json(silent=True) or {}
+    
+    revoke_token(user_data)
+    
+    revoked_refresh = False
+    if data.get('refresh_token'):
+        refresh_payload = verify_token(data['refresh_token'])
+        if refresh_payload and refresh_payload.get('type') == 'refresh' and refresh_payload['id'] == user_data['id']:
+            revoke_token(refresh_payload)
+            revoked_refresh = True
+    
+    return jsonify({
+        'success': True,
+        'message': 'Logged out successfully',
+        'refresh_token_revoked': revoked_refresh
+    }), 200
+
 @app.route('/api/users', methods=['GET'])
 @token_required
 @admin_required
@@ -248,7 +305,7 @@ def get_users(user_data):
     users = load_json('users.json')
     
     # Remove passwords
-    users_response = [{k: v for k, v in u.items() if k != 'password'} for u in users]
+    users_response = [public_user(u) for u in users]
     
     return jsonify({
         'success': True,
@@ -264,13 +321,12 @@ def get_user(user_data, user_id):
     if user_data['id'] != user_id and not user_data.get('is_admin', False):
         return jsonify({'success': False, 'error': 'Unauthorized'}), 403
     
-    users = load_json('users.json')
-    user = next((u for u in users if u['id'] == user_id), None)
+    user = get_user_by_id(user_id)
     
     if not user:
         return jsonify({'success': False, 'error': 'User not found'}), 404
     
-    user_response = {k: v for k, v in user.items() if k != 'password'}
+    user_response = public_user(user)
     
     return jsonify({
         'success': True,
@@ -279,6 +335,7 @@ def get_user(user_data, user_id):
 
 @app.route('/api/users/<int:user_id>', methods=['PUT'])
 @token_required
+@locked('users.json')
 def update_user(user_data, user_id):
     """Update user information"""
     if user_data['id'] != user_id and not user_data.get('is_admin', False):
@@ -287,7 +344,7 @@ def update_user(user_data, user_id):
     data = request.get_json()
     users = load_json('users.json')
     
-    user_index = next((i for i, u in enumerate(users) if u['id'] == user_id), None)
+    user_index = find_user_position(user_id)
     
     if user_index is None:
         return jsonify({'success': False, 'error': 'User not found'}), 404
@@ -299,9 +356,9 @@ def update_user(user_data, user_id):
             users[user_index][field] = data[field]
     
     users[user_index]['updated_at'] = datetime.now().isoformat()
-    save_json('users.json', users)
+    save_users(users, updated=users[user_index])
     
-    user_response = {k: v for k, v in users[user_index].items() if k != 'password'}
+    user_response = public_user(users[user_index])
     
     return jsonify({
         'success': True,
@@ -312,20 +369,24 @@ def update_user(user_data, user_id):
 @app.route('/api/users/<int:user_id>', methods=['DELETE'])
 @token_required
 @admin_required
+@locked('users.json')
 def delete_user(user_data, user_id):
     """Delete user (Admin only) and clean up all associated data"""
     users = load_json('users.json')
     
-    user_index = next((i for i, u in enumerate(users) if u['id'] == user_id), None)
+    user_index = find_user_position(user_id)
     
     if user_index is None:
         return jsonify({'success': False, 'error': 'User not found'}), 404
     
     deleted_user = users.pop(user_index)
-    save_json('users.json', users)
+    save_users(users)
     
     # Clean up all user-associated data to prevent data inheritance issues
     cleanup_user_data(user_id)
+    rebuild_order_indexes()
+    # The cascade removed orders and reviews too; recount everything
+    rebuild_stats()
     
     return jsonify({
         'success': True,
@@ -390,6 +451,8 @@ def get_product(product_id):
     if not product:
         return jsonify({'success': False, 'error': 'Product not found'}), 404
     
+    record_event('product_view', product_id)
+    
     return jsonify({
         'success': True,
         'data': product
@@ -398,6 +461,7 @@ def get_product(product_id):
 @app.route('/api/products', methods=['POST'])
 @token_required
 @admin_required
+@locked('products.json')
 def create_product(user_data):
     """Create a new product (Admin only)"""
     data = request.get_json()
@@ -406,6 +470,9 @@ def create_product(user_data):
     if not all(field in data for field in required_fields):
         return jsonify({'success': False, 'error': 'Missing required fields'}), 400
     
+    if not validate_stock(data.get('stock', 0)):
+        return jsonify({'success': False, 'error': 'Stock must be a non-negative integer'}), 400
+    
     products = load_json('products.json')
     
     new_product = {
@@ -421,6 +488,8 @@ def create_product(user_data):
     
     products.append(new_product)
     save_json('products.json', products)
+    record_change('product', new_product['id'], 'created', new_product)
+    adjust_stats(total_products=1, low_stock_products=is_low_stock(new_product['stock']))
     
     return jsonify({
         'success': True,
@@ -431,6 +500,7 @@ def create_product(user_data):
 @app.route('/api/products/<int:product_id>', methods=['PUT'])
 @token_required
 @admin_required
+@locked('products.json')
 def update_product(user_data, product_id):
     """Update product (Admin only)"""
     data = request.get_json()
@@ -441,6 +511,11 @@ def update_product(user_data, product_id):
     if product_index is None:
         return jsonify({'success': False, 'error': 'Product not found'}), 404
     
+    if 'stock' in data and not validate_stock(data['stock']):
+        return jsonify({'success': False, 'error': 'Stock must be a non-negative integer'}), 400
+    
+    old_stock = products[product_index].get('stock', 0)
+    
     # Update allowed fields
     allowed_fields = ['name', 'description', 'price', 'category', 'stock', 'image_url']
     for field in allowed_fields:
@@ -449,6 +524,8 @@ def update_product(user_data, product_id):
     
     products[product_index]['updated_at'] = datetime.now().isoformat()
     save_json('products.json', products)
+    record_change('product', product_id, 'updated', products[product_index])
+    adjust_stats(low_stock_products=is_low_stock(products[product_index].get('stock', 0)) - is_low_stock(old_stock))
     
     return jsonify({
         'success': True,
@@ -459,6 +536,7 @@ def update_product(user_data, product_id):
 @app.route('/api/products/<int:product_id>', methods=['DELETE'])
 @token_required
 @admin_required
+@locked('products.json')
 def delete_product(user_data, product_id):
     """Delete product (Admin only)"""
     products = load_json('products.json')
@@ -470,6 +548,9 @@ def delete_product(user_data, product_id):
     
     deleted_product = products.pop(product_index)
     save_json('products.json', products)
+    record_change('product', product_id, 'deleted')
+    adjust_stats(total_products=-1, low_stock_products=-is_low_stock(deleted_product.get('stock', 0)))
+    emit('products.deleted', {'product_ids': [product_id]})
     
     return jsonify({
         'success': True,
@@ -515,16 +596,15 @@ def get_products_by_category(category):
 @token_required
 def get_cart(user_data):
     """Get user's cart"""
-    carts = load_json('cart.json')
-    user_cart = [item for item in carts if item['user_id'] == user_data['id']]
+    user_cart = load_cart(user_data['id'])
     
     # Get product details
-    products = load_json('products.json')
+    product_map = load_json_cached('products.json', build_lookup)
     cart_with_details = []
     total = 0
     
-    for item in user_cart:
-        product = next((p for p in products if p['id'] == item['product_id']), None)
+    for item in user_cart.values():
+        product = product_map.get(item['product_id'])
         if product:
             item_total = product['price'] * item['quantity']
             total += item_total
@@ -546,6 +626,7 @@ def get_cart(user_data):
 
 @app.route('/api/cart/items', methods=['POST'])
 @token_required
+@idempotent
 def add_to_cart(user_data):
     """Add item to cart"""
     data = request.get_json()
@@ -561,21 +642,19 @@ def add_to_cart(user_data):
         return jsonify({'success': False, 'error': 'Invalid quantity: must be a positive integer'}), 400
     
     # Verify product exists
-    products = load_json('products.json')
-    product = next((p for p in products if p['id'] == product_id), None)
+    product_map = load_json_cached('products.json', build_lookup)
+    product = product_map.get(product_id) if isinstance(product_id, int) else None
     
     if not product:
         return jsonify({'success': False, 'error': 'Product not found'}), 404
     
-    if product.get('stock', 0) < quantity:
+    if stock_number(product.get('stock')) < quantity:
         return jsonify({'success': False, 'error': 'Insufficient stock'}), 400
     
-    carts = load_json('cart.json')
+    cart = load_cart(user_data['id'])
     
     # Check if item already in cart
-    existing_item = next((item for item in carts 
-                         if item['user_id'] == user_data['id'] and 
-                         item['product_id'] == product_id), None)
+    existing_item = cart.get(product_id)
     
     if existing_item:
         # Update quantity
@@ -583,16 +662,15 @@ def add_to_cart(user_data):
         existing_item['updated_at'] = datetime.now().isoformat()
     else:
         # Add new item
-        new_item = {
-            'id': get_next_id(carts),
+        cart[product_id] = {
+            'id': next_cart_line_id(cart),
             'user_id': user_data['id'],
             'product_id': product_id,
             'quantity': quantity,
             'created_at': datetime.now().isoformat()
         }
-        carts.append(new_item)
     
-    save_json('cart.json', carts)
+    save_cart(user_data['id'], cart)
     
     return jsonify({
         'success': True,
@@ -608,39 +686,35 @@ def update_cart_item(user_data, item_id):
     if 'quantity' not in data:
         return jsonify({'success': False, 'error': 'Quantity is required'}), 400
     
-    carts = load_json('cart.json')
-    
-    item_index = next((i for i, item in enumerate(carts) 
-                      if item['id'] == item_id and item['user_id'] == user_data['id']), None)
+    cart = load_cart(user_data['id'])
+    item = find_cart_line(cart, item_id)
     
-    if item_index is None:
+    if item is None:
         return jsonify({'success': False, 'error': 'Cart item not found'}), 404
     
-    carts[item_index]['quantity'] = data['quantity']
-    carts[item_index]['updated_at'] = datetime.now().isoformat()
+    item['quantity'] = data['quantity']
+    item['updated_at'] = datetime.now().isoformat()
     
-    save_json('cart.json', carts)
+    save_cart(user_data['id'], cart)
     
     return jsonify({
         'success': True,
         'message': 'Cart item updated successfully',
-        'data': carts[item_index]
+        'data': item
     }), 200
 
 @app.route('/api/cart/items/<int:item_id>', methods=['DELETE'])
 @token_required
 def remove_from_cart(user_data, item_id):
     """Remove item from cart"""
-    carts = load_json('cart.json')
+    cart = load_cart(user_data['id'])
+    item = find_cart_line(cart, item_id)
     
-    item_index = next((i for i, item in enumerate(carts) 
-                      if item['id'] == item_id and item['user_id'] == user_data['id']), None)
-    
-    if item_index is None:
+    if item is None:
         return jsonify({'success': False, 'error': 'Cart item not found'}), 404
     
-    removed_item = carts.pop(item_index)
-    save_json('cart.json', carts)
+    removed_item = cart.pop(item['product_id'])
+    save_cart(user_data['id'], cart)
     
     return jsonify({
         'success': True,
@@ -652,21 +726,53 @@ def remove_from_cart(user_data, item_id):
 @token_required
 def clear_cart(user_data):
     """Clear entire cart"""
-    carts = load_json('cart.json')
+    delete_cart(user_data['id'])
     
-    # Remove all items for this user
-    updated_carts = [item for item in carts if item['user_id'] != user_data['id']]
+    return jsonify({
+        'success': True,
+        'message': 'Cart cleared successfully'
+    }), 200
+
+@app.route('/api/cart/reservation', methods=['POST'])
+@token_required
+def reserve_cart(user_data):
+    """Hold stock for the cart while the user completes checkout"""
+    user_cart = load_cart(user_data['id'])
     
-    save_json('cart.json', updated_carts)
+    if not user_cart:
+        return jsonify({'success': False, 'error': 'Cart is empty'}), 400
+    
+    reservation, error = reserve_stock(user_data['id'],
+                                       {pid: item['quantity'] for pid, item in user_cart.items()})
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
     
     return jsonify({
         'success': True,
-        'message': 'Cart cleared successfully'
+        'message': 'Stock reserved for checkout',
+        'data': {
+            'reservation_id': reservation['id'],
+            'items': [{'product_id': pid, 'quantity': qty} for pid, qty in reservation['items'].items()],
+            'expires_at': reservation['expires_at']
+        }
+    }), 201
+
+@app.route('/api/cart/reservation', methods=['DELETE'])
+@token_required
+def release_cart_reservation(user_data):
+    """Release stock held for the user's checkout"""
+    if not release_reservation(user_data['id']):
+        return jsonify({'success': False, 'error': 'No active reservation'}), 404
+    
+    return jsonify({
+        'success': True,
+        'message': 'Reservation released'
     }), 200
 
 # ============== ORDER MANAGEMENT ==============
 @app.route('/api/orders', methods=['POST'])
 @token_required
+@idempotent
 def create_order(user_data):
     """Create new order from cart"""
     data = request.get_json()
@@ -676,26 +782,26 @@ def create_order(user_data):
         return jsonify({'success': False, 'error': 'Shipping address is required'}), 400
     
     # Get user's cart
-    carts = load_json('cart.json')
-    user_cart = [item for item in carts if item['user_id'] == user_data['id']]
+    user_cart = list(load_cart(user_data['id']).values())
     
     if not user_cart:
         return jsonify({'success': False, 'error': 'Cart is empty'}), 400
     
+    # Hold stock atomically (re-uses the cart's checkout reservation if still valid)
+    reservation, error = reserve_stock(user_data['id'],
+                                       {item['product_id']: item['quantity'] for item in user_cart},
+                                       data.get('reservation_id'))
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    
     # Get product details and calculate total
-    products = load_json('products.json')
+    product_map = load_json_cached('products.json', build_lookup)
     order_items = []
     total_amount = 0
     
     for cart_item in user_cart:
-        product = next((p for p in products if p['id'] == cart_item['product_id']), None)
-        if product:
-            if product.get('stock', 0) < cart_item['quantity']:
-                return jsonify({
-                    'success': False, 
-                    'error': f'Insufficient stock for {product["name"]}'
-                }), 400
-            
+        product = product_map.get(cart_item['product_id'])
+        if product and cart_item['product_id'] in reservation['items']:
             item_total = product['price'] * cart_item['quantity']
             total_amount += item_total
             
@@ -710,32 +816,35 @@ def create_order(user_data):
     # Apply price fail for API testing
     total_amount = apply_price_fail(total_amount, 'apitotalprice')
     
-    # Create order
-    orders = load_json('orders.json')
-    
-    new_order = {
-        'id': get_next_id(orders),
-        'user_id': user_data['id'],
-        'items': order_items,
-        'total_amount': total_amount,
-        'status': 'pending',
-        'shipping_address': data.get('shipping_address'),
-        'created_at': datetime.now().isoformat()
-    }
+    # Stock held by the reservation becomes sold, unless it expired and went back on sale
+    if not commit_reservation(reservation['id']):
+        return jsonify({'success': False, 'error': 'Stock reservation expired, please try again'}), 409
     
-    orders.append(new_order)
-    save_json('orders.json', orders)
+    # Create order
+    created_at = datetime.now()
+    with file_lock('orders.json'):
+        orders = load_json('orders.json')
+        
+        new_order = {
+            'id': get_next_id(orders),
+            'user_id': user_data['id'],
+            'items': order_items,
+            'total_amount': total_amount,
+            'status': 'pending',
+            'shipping_address': data.get('shipping_address'),
+            'created_at': created_at.isoformat(),
+            'created_ts': order_timestamp(created_at)
+        }
+        
+        orders.append(new_order)
+        save_json('orders.json', orders)
+        index_order(new_order)
+        record_change('order', new_order['id'], 'created', new_order)
     
-    # Update product stock
-    for item in order_items:
-        product_index = next((i for i, p in enumerate(products) if p['id'] == item['product_id']), None)
-        if product_index is not None:
-            products[product_index]['stock'] -= item['quantity']
-    save_json('products.json', products)
+    emit('order.created', {'order': new_order})
     
     # Clear user's cart
-    updated_carts = [item for item in carts if item['user_id'] != user_data['id']]
-    save_json('cart.json', updated_carts)
+    delete_cart(user_data['id'])
     
     return jsonify({
         'success': True,
@@ -746,8 +855,11 @@ def create_order(user_data):
 @app.route('/api/orders', methods=['GET'])
 @token_required
 def get_orders(user_data):
-    """Get user's orders"""
-    orders = load_json('orders.json')
+    """Get user's orders (summaries unless expand=items)"""
+    if request.args.get('expand') == 'items':
+        orders = load_json('orders.json')
+    else:
+        orders = order_summaries()
     
     if user_data.get('is_admin', False):
         # Admin can see all orders
@@ -784,6 +896,7 @@ def get_order(user_data, order_id):
 @app.route('/api/orders/<int:order_id>/status', methods=['PUT'])
 @token_required
 @admin_required
+@locked('orders.json')
 def update_order_status(user_data, order_id):
     """Update order status (Admin only) with workflow validation"""
     data = request.get_json()
@@ -829,10 +942,17 @@ def update_order_status(user_data, order_id):
             'error': f'Cannot transition from {current_status} to {new_status}. Allowed: {", ".join(allowed_transitions.get(current_status, ["none"]))}'
         }), 400
     
+    # Cancelled orders give their stock back, as in cancel_order
+    if new_status == 'cancelled':
+        restock_order(orders[order_index])
+    
     orders[order_index]['status'] = new_status
     orders[order_index]['updated_at'] = datetime.now().isoformat()
     
     save_json('orders.json', orders)
+    index_order(orders[order_index], current_status)
+    record_change('order', order_id, 'status_changed', orders[order_index])
+    emit('order.status_changed', {'order': orders[order_index], 'previous_status': current_status})
     
     return jsonify({
         'success': True,
@@ -842,6 +962,7 @@ def update_order_status(user_data, order_id):
 
 @app.route('/api/orders/<int:order_id>', methods=['PUT'])
 @token_required
+@locked('orders.json')
 def update_order(user_data, order_id):
     """Update order details"""
     data = request.get_json()
@@ -874,6 +995,7 @@ def update_order(user_data, order_id):
     
     orders[order_index]['updated_at'] = datetime.now().isoformat()
     save_json('orders.json', orders)
+    record_change('order', order_id, 'updated', orders[order_index])
     
     return jsonify({
         'success': True,
@@ -883,6 +1005,7 @@ def update_order(user_data, order_id):
 
 @app.route('/api/orders/<int:order_id>', methods=['DELETE'])
 @token_required
+@locked('orders.json')
 def cancel_order(user_data, order_id):
     """Cancel order and restore items to cart"""
     orders = load_json('orders.json')
@@ -909,23 +1032,16 @@ def cancel_order(user_data, order_id):
         return jsonify({'success': False, 'error': f'Cannot cancel this order. Allowed statuses: {", ".join(allowed_cancel_statuses)}'}), 400
     
     # Restore stock
-    products = load_json('products.json')
-    for item in order['items']:
-        product_index = next((i for i, p in enumerate(products) if p['id'] == item['product_id']), None)
-        if product_index is not None:
-            products[product_index]['stock'] += item['quantity']
-    save_json('products.json', products)
+    restock_order(order)
     
-    # FEATURE: Restore items to cart
-    carts = load_json('cart.json')
+    # FEATURE: Restore items to the order owner's cart
+    product_map = load_json_cached('products.json', build_lookup)
+    cart = load_cart(order['user_id'])
     for item in order['items']:
         # Check if product still exists
-        product = next((p for p in products if p['id'] == item['product_id']), None)
-        if product:
+        if item['product_id'] in product_map:
             # Check if item already in cart
-            existing_cart_item = next((c for c in carts 
-                                     if c['user_id'] == user_data['id'] and 
-                                     c['product_id'] == item['product_id']), None)
+            existing_cart_item = cart.get(item['product_id'])
             
             if existing_cart_item:
                 # Increase quantity
@@ -933,23 +1049,26 @@ def cancel_order(user_data, order_id):
                 existing_cart_item['updated_at'] = datetime.now().isoformat()
             else:
                 # Add new cart item
-                new_cart_item = {
-                    'id': get_next_id(carts),
-                    'user_id': user_data['id'],
+                cart[item['product_id']] = {
+                    'id': next_cart_line_id(cart),
+                    'user_id': order['user_id'],
                     'product_id': item['product_id'],
                     'quantity': item['quantity'],
                     'created_at': datetime.now().isoformat()
                 }
-                carts.append(new_cart_item)
     
-    save_json('cart.json', carts)
+    save_cart(order['user_id'], cart)
     
     # Update order status
+    previous_status = order['status']
     orders[order_index]['status'] = 'cancelled'
     orders[order_index]['cancelled_at'] = datetime.now().isoformat()
     orders[order_index]['cart_restored'] = True
     
     save_json('orders.json', orders)
+    index_order(orders[order_index], previous_status)
+    record_change('order', order_id, 'cancelled', orders[order_index])
+    emit('order.status_changed', {'order': orders[order_index], 'previous_status': previous_status})
     
     return jsonify({
         'success': True,
@@ -961,14 +1080,17 @@ def cancel_order(user_data, order_id):
 @app.route('/api/orders/status/<string:status>', methods=['GET'])
 @token_required
 def get_orders_by_status(user_data, status):
-    """Get orders by status"""
-    orders = load_json('orders.json')
+    """Get orders by status (summaries unless expand=items)"""
+    if request.args.get('expand') == 'items':
+        order_map = load_json_cached('orders.json', build_lookup)
+    else:
+        order_map = order_summary_map()
+    status_orders = [order_map[i] for i in order_ids_with_status(status) if i in order_map]
     
     if user_data.get('is_admin', False):
-        filtered_orders = [o for o in orders if o['status'] == status]
+        filtered_orders = status_orders
     else:
-        filtered_orders = [o for o in orders 
-                          if o['user_id'] == user_data['id'] and o['status'] == status]
+        filtered_orders = [o for o in status_orders if o['user_id'] == user_data['id']]
     
     return jsonify({
         'success': True,
@@ -1174,6 +1296,7 @@ def cleanup_duplicate_likes(user_data):
 # ============== REVIEWS ==============
 @app.route('/api/reviews', methods=['POST'])
 @token_required
+@idempotent
 def create_review(user_data):
     """Create product review"""
     data = request.get_json()
@@ -1207,6 +1330,7 @@ def create_review(user_data):
     
     reviews.append(new_review)
     save_json('reviews.json', reviews)
+    adjust_stats(total_reviews=1)
     
     return jsonify({
         'success': True,
@@ -1253,30 +1377,19 @@ def get_product_reviews(product_id):
 @admin_required
 def get_stats(user_data):
     """Get dashboard statistics (Admin only)"""
-    users = load_json('users.json')
-    products = load_json('products.json')
-    orders = load_json('orders.json')
-    reviews = load_json('reviews.json')
-    
-    # Calculate statistics
-    total_users = len(users)
-    total_products = len(products)
-    total_orders = len(orders)
-    total_revenue = sum(o['total_amount'] for o in orders if o['status'] != 'cancelled')
-    
-    pending_orders = len([o for o in orders if o['status'] == 'pending'])
-    low_stock_products = len([p for p in products if p.get('stock', 0) < 10])
+    # Materialized counters, maintained by the handlers that change them
+    stats = get_stats_counters()
     
     return jsonify({
         'success': True,
         'data': {
-            'total_users': total_users,
-            'total_products': total_products,
-            'total_orders': total_orders,
-            'total_revenue': round(total_revenue, 2),
-            'pending_orders': pending_orders,
-            'low_stock_products': low_stock_products,
-            'total_reviews': len(reviews)
+            'total_users': stats['total_users'],
+            'total_products': stats['total_products'],
+            'total_orders': stats['total_orders'],
+            'total_revenue': stats['total_revenue'],
+            'pending_orders': order_status_counts().get('pending', 0),
+            'low_stock_products': stats['low_stock_products'],
+            'total_reviews': stats['total_reviews']
         }
     }), 200
 
@@ -1285,11 +1398,12 @@ def get_stats(user_data):
 @token_required
 @admin_required
 def get_low_stock_products(user_data):
-    """Get products with low stock (Admin only)"""
-    products = load_json('products.json')
+    """Get products with stock at or below threshold, lowest first (Admin only)"""
     threshold = request.args.get('threshold', 10, type=int)
     
-    low_stock_products = [p for p in products if p.get('stock', 0) <= threshold]
+    # Stock-ordered index: a bisect plus the matching products, not a scan
+    product_map = load_json_cached('products.json', build_lookup)
+    low_stock_products = [product_map[pid] for pid in low_stock_ids(threshold) if pid in product_map]
     
     return jsonify({
         'success': True,
@@ -1301,6 +1415,7 @@ def get_low_stock_products(user_data):
 @app.route('/api/inventory/update-stock', methods=['PUT'])
 @token_required
 @admin_required
+@locked('products.json')
 def update_product_stock(user_data):
     """Update product stock (Admin only)"""
     data = request.get_json()
@@ -1308,6 +1423,9 @@ def update_product_stock(user_data):
     if not data or not data.get('product_id') or 'stock' not in data:
         return jsonify({'success': False, 'error': 'Product ID and stock are required'}), 400
     
+    if not validate_stock(data['stock']):
+        return jsonify({'success': False, 'error': 'Stock must be a non-negative integer'}), 400
+    
     products = load_json('products.json')
     product_index = next((i for i, p in enumerate(products) if p['id'] == data['product_id']), None)
     
@@ -1319,6 +1437,8 @@ def update_product_stock(user_data):
     products[product_index]['updated_at'] = datetime.now().isoformat()
     
     save_json('products.json', products)
+    record_change('product', data['product_id'], 'stock', products[product_index])
+    adjust_stats(low_stock_products=is_low_stock(data['stock']) - is_low_stock(old_stock))
     
     return jsonify({
         'success': True,
@@ -1335,28 +1455,31 @@ def update_product_stock(user_data):
 @token_required
 @admin_required
 def get_user_activity(user_data, user_id):
-    """Get user activity (Admin only)"""
-    orders = load_json('orders.json')
-    reviews = load_json('reviews.json')
-    carts = load_json('cart.json')
+    """Get user activity summary and timeline, newest first (Admin only)
+
+    Page with ?limit= (max 100) and ?before=<next_cursor>; ?types= filters
+    to order, review, like, wishlist and/or cart.
+    """
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    types = request.args.get('types')
+    types = tuple(types.split(',')) if types else ACTIVITY_TYPES
+    if any(t not in ACTIVITY_TYPES for t in types):
+        return jsonify({'success': False, 'error': f'types must be among: {", ".join(ACTIVITY_TYPES)}'}), 400
     
-    user_orders = [o for o in orders if o['user_id'] == user_id]
-    user_reviews = [r for r in reviews if r['user_id'] == user_id]
-    user_cart_items = [c for c in carts if c['user_id'] == user_id]
+    try:
+        before = decode_cursor(request.args['before']) if request.args.get('before') else None
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     
-    # Calculate total spent
-    total_spent = sum(o['total_amount'] for o in user_orders if o['status'] != 'cancelled')
+    timeline, next_cursor = user_timeline(user_id, before, limit, types)
     
     return jsonify({
         'success': True,
         'data': {
             'user_id': user_id,
-            'total_orders': len(user_orders),
-            'total_reviews': len(user_reviews),
-            'cart_items': len(user_cart_items),
-            'total_spent': total_spent,
-            'orders': user_orders,
-            'reviews': user_reviews
+            **user_activity_summary(user_id),
+            'timeline': timeline,
+            'next_cursor': next_cursor
         }
     }), 200
 
@@ -1364,34 +1487,166 @@ def get_user_activity(user_data, user_id):
 @app.route('/api/products/bulk-update', methods=['PUT'])
 @token_required
 @admin_required
+@locked('products.json')
 def bulk_update_products(user_data):
-    """Bulk update products (Admin only)"""
+    """Bulk update products (Admin only) with per-item results"""
     data = request.get_json()
     
-    if not data or not data.get('updates'):
+    if not isinstance(data, dict) or not isinstance(data.get('updates'), list) or not data['updates']:
         return jsonify({'success': False, 'error': 'Updates array is required'}), 400
     
     products = load_json('products.json')
-    updated_count = 0
+    product_index = build_index(products)
+    allowed_fields = ['name', 'description', 'price', 'category', 'stock', 'image_url']
+    now = datetime.now().isoformat()
+    results = []
     
-    for update in data['updates']:
-        product_index = next((i for i, p in enumerate(products) if p['id'] == update['product_id']), None)
-        if product_index is not None:
-            # Update allowed fields
-            allowed_fields = ['name', 'description', 'price', 'category', 'stock', 'image_url']
-            for field in allowed_fields:
-                if field in update:
-                    products[product_index][field] = update[field]
-            
-            products[product_index]['updated_at'] = datetime.now().isoformat()
-            updated_count += 1
+    low_stock_delta = 0
     
-    save_json('products.json', products)
+    for update in data['updates']:
+        product_id = update.get('product_id') if isinstance(update, dict) else None
+        if not validate_id(product_id):
+            results.append({'product_id': product_id, 'success': False, 'error': 'product_id must be an integer'})
+            continue
+        index = product_index.get(product_id)
+        if index is None:
+            results.append({'product_id': product_id, 'success': False, 'error': 'Product not found'})
+            continue
+        
+        if 'stock' in update and not validate_stock(update['stock']):
+            results.append({'product_id': product_id, 'success': False, 'error': 'Stock must be a non-negative integer'})
+            continue
+        
+        old_stock = products[index].get('stock', 0)
+        for field in allowed_fields:
+            if field in update:
+                products[index][field] = update[field]
+        low_stock_delta += is_low_stock(products[index].get('stock', 0)) - is_low_stock(old_stock)
+        products[index]['updated_at'] = now
+        results.append({'product_id': product_id, 'success': True})
+    
+    updated_count = sum(1 for r in results if r['success'])
+    
+    # Single write so dependent caches are invalidated once
+    if updated_count:
+        save_json('products.json', products)
+        record_changes([('product', r['product_id'], 'updated', products[product_index[r['product_id']]])
+                        for r in results if r['success']])
+        adjust_stats(low_stock_products=low_stock_delta)
     
     return jsonify({
         'success': True,
         'message': f'{updated_count} products updated successfully',
-        'updated_count': updated_count
+        'updated_count': updated_count,
+        'failed_count': len(results) - updated_count,
+        'results': results
+    }), 200
+
+@app.route('/api/products/bulk-delete', methods=['DELETE'])
+@token_required
+@admin_required
+@locked('products.json')
+def bulk_delete_products(user_data):
+    """Bulk delete products (Admin only) with per-item results"""
+    data = request.get_json()
+    
+    if not isinstance(data, dict) or not isinstance(data.get('product_ids'), list) or not data['product_ids']:
+        return jsonify({'success': False, 'error': 'Product IDs array is required'}), 400
+    
+    products = load_json('products.json')
+    product_index = build_index(products)
+    
+    results = []
+    delete_ids = set()
+    for product_id in data['product_ids']:
+        if not validate_id(product_id):
+            results.append({'product_id': product_id, 'success': False, 'error': 'product_id must be an integer'})
+        elif product_id in delete_ids:
+            results.append({'product_id': product_id, 'success': False, 'error': 'Duplicate product ID'})
+        elif product_id in product_index:
+            delete_ids.add(product_id)
+            results.append({'product_id': product_id, 'success': True})
+        else:
+            results.append({'product_id': product_id, 'success': False, 'error': 'Product not found'})
+    
+    if delete_ids:
+        low_stock_deleted = sum(is_low_stock(products[product_index[pid]].get('stock', 0)) for pid in delete_ids)
+        products = [p for p in products if p['id'] not in delete_ids]
+        save_json('products.json', products)
+        record_changes([('product', pid, 'deleted', None) for pid in sorted(delete_ids)])
+        adjust_stats(total_products=-len(delete_ids), low_stock_products=-low_stock_deleted)
+        emit('products.deleted', {'product_ids': sorted(delete_ids)})
+    
+    return jsonify({
+        'success': True,
+        'message': f'{len(delete_ids)} products deleted successfully',
+        'deleted_count': len(delete_ids),
+        'failed_count': len(results) - len(delete_ids),
+        'results': results
+    }), 200
+
+@app.route('/api/products/bulk-stock', methods=['PUT'])
+@token_required
+@admin_required
+@locked('products.json')
+def bulk_adjust_stock(user_data):
+    """Bulk adjust product stock by delta (Admin only) with per-item results"""
+    data = request.get_json()
+    
+    if not isinstance(data, dict) or not isinstance(data.get('adjustments'), list) or not data['adjustments']:
+        return jsonify({'success': False, 'error': 'Adjustments array is required'}), 400
+    
+    products = load_json('products.json')
+    product_index = build_index(products)
+    now = datetime.now().isoformat()
+    results = []
+    
+    low_stock_delta = 0
+    
+    for adjustment in data['adjustments']:
+        product_id = adjustment.get('product_id') if isinstance(adjustment, dict) else None
+        if not validate_id(product_id):
+            results.append({'product_id': product_id, 'success': False, 'error': 'product_id must be an integer'})
+            continue
+        index = product_index.get(product_id)
+        if index is None:
+            results.append({'product_id': product_id, 'success': False, 'error': 'Product not found'})
+            continue
+        
+        delta = adjustment.get('delta')
+        if not isinstance(delta, int) or isinstance(delta, bool):
+            results.append({'product_id': product_id, 'success': False, 'error': 'Delta must be an integer'})
+            continue
+        
+        old_stock = stock_number(products[index].get('stock'))
+        if old_stock + delta < 0:
+            results.append({'product_id': product_id, 'success': False, 'error': 'Insufficient stock'})
+            continue
+        
+        products[index]['stock'] = old_stock + delta
+        products[index]['updated_at'] = now
+        low_stock_delta += is_low_stock(old_stock + delta) - is_low_stock(old_stock)
+        results.append({
+            'product_id': product_id,
+            'success': True,
+            'old_stock': old_stock,
+            'new_stock': old_stock + delta
+        })
+    
+    adjusted_count = sum(1 for r in results if r['success'])
+    
+    if adjusted_count:
+        save_json('products.json', products)
+        record_changes([('product', r['product_id'], 'stock', products[product_index[r['product_id']]])
+                        for r in results if r['success']])
+        adjust_stats(low_stock_products=low_stock_delta)
+    
+    return jsonify({
+        'success': True,
+        'message': f'{adjusted_count} products adjusted successfully',
+        'adjusted_count': adjusted_count,
+        'failed_count': len(results) - adjusted_count,
+        'results': results
     }), 200
 
 # ============== EXPORT FUNCTIONALITY ==============
@@ -1418,17 +1673,23 @@ def export_products(user_data):
 @admin_required
 def export_orders(user_data):
     """Export orders to JSON (Admin only)"""
-    orders = load_json('orders.json')
-    
     # Optional date filtering
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
     
     if start_date and end_date:
-        filtered_orders = [o for o in orders 
-                          if start_date <= o['created_at'][:10] <= end_date]
+        try:
+            start_day = datetime.fromisoformat(start_date[:10])
+            end_day = datetime.fromisoformat(end_date[:10])
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Invalid date format, use YYYY-MM-DD'}), 400
+        
+        # Whole days: [start_date 00:00, day after end_date 00:00)
+        filtered_orders = orders_between(order_timestamp(start_day),
+                                         order_timestamp(end_day + timedelta(days=1)),
+                                         end_inclusive=False)
     else:
-        filtered_orders = orders
+        filtered_orders = load_json('orders.json')
     
     export_data = {
         'export_date': datetime.now().isoformat(),
@@ -1442,6 +1703,36 @@ def export_orders(user_data):
         'data': export_data
     }), 200
 
+# ============== CHANGE FEED ==============
+@app.route('/api/changes', methods=['GET'])
+@token_required
+@admin_required
+def get_changes(user_data):
+    """Order/product/cart changes after a sequence number (Admin only)"""
+    try:
+        since = int(request.args.get('since', 0))
+        limit = int(request.args.get('limit', 100))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'since and limit must be integers'}), 400
+
+    if since < 0 or not 1 <= limit <= 1000:
+        return jsonify({'success': False, 'error': 'since must be >= 0 and limit between 1 and 1000'}), 400
+
+    entity = request.args.get('entity')
+    if entity and entity not in ['order', 'product', 'cart']:
+        return jsonify({'success': False, 'error': 'entity must be order, product or cart'}), 400
+
+    changes, last_seq, has_more = changes_since(since, limit, entity)
+
+    # Older entries are compacted away; a client with since < first_seq - 1 must resync
+    return jsonify({
+        'success': True,
+        'data': changes,
+        'last_seq': last_seq,
+        'has_more': has_more,
+        'first_seq': first_seq()
+    }), 200
+
 # ============== SYSTEM HEALTH & MONITORING ==============
 @app.route('/api/system/health', methods=['GET'])
 def system_health():
@@ -1449,7 +1740,7 @@ def system_health():
     try:
         # Check if all data files are accessible
         data_files = ['users.json', 'products.json', 'orders.json', 'categories.json', 
-                     'reviews.json', 'cart.json', 'help.json', 'contact_messages.json',
+                     'reviews.json', 'help.json', 'contact_messages.json',
                      'wishlist.json', 'coupons.json', 'notifications.json', 'analytics.json']
         
         file_status = {}
@@ -1485,6 +1776,37 @@ def system_health():
             'timestamp': datetime.now().isoformat()
         }), 500
 
+@app.route('/api/system/password-migration', methods=['GET'])
+@token_required
+@admin_required
+def password_migration_status(user_data):
+    """Progress of the lazy SHA256 -> bcrypt password migration (Admin only)"""
+    by_algorithm = {}
+    by_cost = {}
+    up_to_date = 0
+    users = load_users()
+    for user in users:
+        algorithm, cost = hash_info(user['password'])
+        by_algorithm[algorithm] = by_algorithm.get(algorithm, 0) + 1
+        if cost is not None:
+            by_cost[str(cost)] = by_cost.get(str(cost), 0) + 1
+        if not needs_rehash(user['password']):
+            up_to_date += 1
+    
+    return jsonify({
+        'success': True,
+        'data': {
+            'target_algorithm': Config.PASSWORD_HASHER,
+            'target_cost': Config.BCRYPT_ROUNDS if Config.PASSWORD_HASHER == 'bcrypt' else None,
+            'total_users': len(users),
+            'by_algorithm': by_algorithm,
+            'bcrypt_by_cost': by_cost,
+            'up_to_date': up_to_date,
+            'pending': len(users) - up_to_date,
+            'progress_percent': round(up_to_date / len(users) * 100, 2) if users else 100.0
+        }
+    }), 200
+
 # ============== API DOCUMENTATION ==============
 @app.route('/api/docs', methods=['GET'])
 def api_documentation():
@@ -1493,6 +1815,7 @@ def api_documentation():
         'authentication': {
             'POST /api/register': 'Register a new user',
             'POST /api/login': 'User login',
+            'POST /api/logout': 'Revoke the current token (optional refresh_token in body)',
         },
         'users': {
             'GET /api/users': 'Get all users (Admin)',
@@ -1515,15 +1838,17 @@ def api_documentation():
             'PUT /api/cart/items/{id}': 'Update cart item',
             'DELETE /api/cart/items/{id}': 'Remove from cart',
             'DELETE /api/cart': 'Clear cart',
+            'POST /api/cart/reservation': 'Reserve cart stock for checkout',
+            'DELETE /api/cart/reservation': 'Release cart stock reservation',
         },
         'orders': {
-            'POST /api/orders': 'Create order',
-            'GET /api/orders': 'Get user orders',
+            'POST /api/orders': 'Create order (optional reservation_id)',
+            'GET /api/orders': 'Get user order summaries (expand=items for full orders)',
             'GET /api/orders/{id}': 'Get order by ID',
             'PUT /api/orders/{id}': 'Update order details (shipping address)',
             'PUT /api/orders/{id}/status': 'Update order status (Admin)',
             'DELETE /api/orders/{id}': 'Cancel order',
-            'GET /api/orders/status/{status}': 'Get orders by status',
+            'GET /api/orders/status/{status}': 'Get orders by status (expand=items for full orders)',
         },
         'reviews': {
             'POST /api/reviews': 'Create product review',
@@ -1559,14 +1884,18 @@ def api_documentation():
         },
         'analytics': {
             'GET /api/analytics/dashboard': 'Get dashboard analytics (Admin)',
-            'GET /api/analytics/reports/sales': 'Get sales report (Admin)',
+            'GET /api/analytics/reports/sales': 'Get sales report (Admin); group_by=day|week|month returns a rollup series',
+            'GET /api/analytics/traffic': 'Daily page/product/blog views, unique visitors and top products/pages (Admin)',
+            'POST /api/events': 'Record client events (page_view, search, click); buffered and flushed periodically',
+            'GET /api/analytics/query': 'Ad-hoc order analytics (Admin); group_by, sort, limit, start_date, end_date, status',
         },
         'search': {
             'GET /api/search/advanced': 'Advanced product search',
         },
         'recommendations': {
-            'GET /api/recommendations/{id}': 'Get product recommendations',
+            'GET /api/recommendations/{id}': 'Get product recommendations (strategy=hybrid|also_bought|content|category)',
             'GET /api/recommendations/user/{id}': 'Get user recommendations',
+            'POST /api/recommendations/refresh': 'Refresh all recommendations (Admin)',
         },
         'blog': {
             'GET /api/blog/posts': 'Get blog posts',
@@ -1574,16 +1903,20 @@ def api_documentation():
         },
         'admin': {
             'GET /api/stats': 'Get dashboard statistics',
-            'GET /api/inventory/low-stock': 'Get low stock products',
+            'GET /api/inventory/low-stock': 'Get products at or below ?threshold (default 10), lowest stock first',
             'PUT /api/inventory/update-stock': 'Update product stock',
-            'GET /api/users/{id}/activity': 'Get user activity',
+            'GET /api/users/{id}/activity': 'Get user activity summary and paginated timeline (limit, before, types)',
             'PUT /api/products/bulk-update': 'Bulk update products',
+            'DELETE /api/products/bulk-delete': 'Bulk delete products',
+            'PUT /api/products/bulk-stock': 'Bulk adjust product stock by delta',
             'GET /api/export/products': 'Export products',
             'GET /api/export/orders': 'Export orders',
+            'GET /api/changes': 'Order/product/cart change feed (since, limit, entity)',
         },
         'system': {
             'GET /api/health': 'Health check',
             'GET /api/system/health': 'System health status',
+            'GET /api/system/password-migration': 'SHA256 -> bcrypt password migration progress (Admin)',
             'GET /api/docs': 'API documentation',
         }
     }
@@ -1726,5 +2059,9 @@ def not_found(error):
 def internal_error(error):
     return jsonify({'success': False, 'error': 'Internal server error'}), 500
 
+@app.errorhandler(PasswordHasherBusy)
+def password_hasher_busy(error):
+    return jsonify({'success': False, 'error': 'Server is busy, please retry shortly'}), 503, {'Retry-After': '1'}
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -1,4 +1,5 @@
 import jwt
+import uuid
 import hashlib
 from datetime import datetime, timedelta
 from config import Config
@@ -28,6 +29,7 @@ def generate_token(user_id, email, is_admin=False):
         'email': email,
         'is_admin': is_admin,
         'type': 'access',
+        'jti': uuid.uuid4().hex,  # Lets a single token be revoked on logout
         'exp': datetime.utcnow() + Config.JWT_ACCESS_TOKEN_EXPIRES
     }
     
@@ -41,6 +43,7 @@ def generate_refresh_token(user_id, email):
         'id': user_id,
         'email': email,
         'type': 'refresh',
+        'jti': uuid.uuid4().hex,
         'exp': datetime.utcnow() + Config.JWT_REFRESH_TOKEN_EXPIRES
     }
     
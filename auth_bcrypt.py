@@ -1,14 +1,15 @@
 import jwt
+import uuid
 import bcrypt
 from datetime import datetime, timedelta
 from config import Config
 #This  handles user authentication and password security
 
 #Convert password to bcrypt hash for storage (PRODUCTION-READY)
-def hash_password(password):
+def hash_password(password, rounds=12):
     """Hash password using bcrypt (industry standard)"""
     # Generate salt and hash password
-    salt = bcrypt.gensalt(rounds=12)  # 12 rounds = good balance of security/performance
+    salt = bcrypt.gensalt(rounds=rounds)  # 12 rounds = good balance of security/performance
     hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
     return hashed.decode('utf-8')  # Store as string in JSON
 
@@ -28,6 +29,7 @@ def generate_token(user_id, email, is_admin=False):
         'email': email,
         'is_admin': is_admin,
         'type': 'access',
+        'jti': uuid.uuid4().hex,  # Lets a single token be revoked on logout
         'exp': datetime.utcnow() + Config.JWT_ACCESS_TOKEN_EXPIRES
     }
     
@@ -41,6 +43,7 @@ def generate_refresh_token(user_id, email):
         'id': user_id,
         'email': email,
         'type': 'refresh',
+        'jti': uuid.uuid4().hex,
         'exp': datetime.utcnow() + Config.JWT_REFRESH_TOKEN_EXPIRES
     }
     
@@ -0,0 +1,102 @@
+"""
+Shared route decorators (token_required / admin_required)
+Verified token payloads are kept in a small LRU keyed by the token's SHA256
+digest, so repeat requests with the same token skip jwt.decode. An entry
+never outlives the token's own exp claim. Revocation (revocation.py) is
+checked on every request, after the cache.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import jsonify, request
+
+from auth import verify_token
+from config import Config
+from revocation import is_revoked
+
+
+class TokenCache:
+    """Bounded LRU of token digest -> (payload, expires_at)"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest):
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._entries[digest]
+                return None
+            self._entries.move_to_end(digest)
+            return entry[0]
+
+    def put(self, digest, payload):
+        expires_at = min(payload.get('exp', 0), time.time() + self.ttl)
+        with self._lock:
+            self._entries[digest] = (payload, expires_at)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache(Config.TOKEN_CACHE_SIZE, Config.TOKEN_CACHE_TTL.total_seconds())
+
+
+def verify_token_cached(token):
+    """verify_token() with the result cached until exp (or the cache TTL)"""
+    digest = hashlib.sha256(token.encode()).hexdigest()
+    payload = token_cache.get(digest)
+    if payload is None:
+        payload = verify_token(token)
+        if not payload:
+            return None
+        token_cache.put(digest, payload)
+    # Routes get their own copy so they can't alter the cached payload
+    return dict(payload)
+
+
+# Authentication decorator
+def token_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        token = request.headers.get('Authorization')
+
+        if not token:
+            return jsonify({'success': False, 'error': 'Token is missing'}), 401
+
+        if token.startswith('Bearer '):
+            token = token[7:]
+
+        user_data = verify_token_cached(token)
+        if not user_data:
+            return jsonify({'success': False, 'error': 'Token is invalid or expired'}), 401
+
+        if user_data.get('jti') and is_revoked(user_data['jti']):
+            return jsonify({'success': False, 'error': 'Token has been revoked'}), 401
+
+        return f(user_data, *args, **kwargs)
+
+    return decorated
+
+
+# Admin check decorator
+def admin_required(f):
+    @wraps(f)
+    def decorated(user_data, *args, **kwargs):
+        if not user_data.get('is_admin', False):
+            return jsonify({'success': False, 'error': 'Admin privileges required'}), 403
+        return f(user_data, *args, **kwargs)
+    return decorated
@@ -0,0 +1,95 @@
+"""
+Per-user cart storage
+Each user's cart lives in carts/<user_id>.json as {product_id: line}, so cart
+operations only read and write the caller's cart, independent of how many
+other carts are active. Line ids are unique within a user's cart.
+"""
+
+import os
+
+from config import Config
+from utils import load_json, save_json, get_next_id
+from change_log import record_change
+
+CART_DIR = 'carts'
+LEGACY_CART_FILE = 'cart.json'
+
+
+def _cart_file(user_id):
+    return os.path.join(CART_DIR, f'{int(user_id)}.json')
+
+
+def load_cart(user_id):
+    """Load a user's cart as {product_id: line}"""
+    data = load_json(_cart_file(user_id))
+    if not data:
+        return {}
+    return {int(product_id): line for product_id, line in data.items()}
+
+
+def save_cart(user_id, cart):
+    """Save a user's cart (an empty cart removes the file)"""
+    if not cart:
+        delete_cart(user_id)
+        return
+    save_json(_cart_file(user_id), cart)
+    record_change('cart', int(user_id), 'updated', list(cart.values()))
+
+
+def delete_cart(user_id):
+    """Remove a user's cart entirely"""
+    try:
+        os.remove(os.path.join(Config.DATA_DIR, _cart_file(user_id)))
+    except FileNotFoundError:
+        return
+    record_change('cart', int(user_id), 'deleted')
+
+
+def remove_products_from_carts(product_ids):
+    """Drop lines of deleted products from every user's cart; returns the number of carts changed"""
+    cart_dir = os.path.join(Config.DATA_DIR, CART_DIR)
+    if not os.path.isdir(cart_dir):
+        return 0
+
+    product_ids = set(product_ids)
+    changed = 0
+    for filename in os.listdir(cart_dir):
+        user_id, ext = os.path.splitext(filename)
+        if ext != '.json' or not user_id.isdigit():
+            continue
+        cart = load_cart(user_id)
+        kept = {pid: line for pid, line in cart.items() if pid not in product_ids}
+        if len(kept) != len(cart):
+            save_cart(user_id, kept)
+            changed += 1
+    return changed
+
+
+def find_cart_line(cart, item_id):
+    """Find a line in a user's cart by its line id"""
+    return next((line for line in cart.values() if line['id'] == item_id), None)
+
+
+def next_cart_line_id(cart):
+    """Next line id within a user's cart"""
+    return get_next_id(list(cart.values()))
+
+
+def migrate_legacy_cart():
+    """Split the old global cart.json list into per-user cart files"""
+    legacy_path = os.path.join(Config.DATA_DIR, LEGACY_CART_FILE)
+    if not os.path.exists(legacy_path):
+        return 0
+
+    lines_by_user = {}
+    for line in load_json(LEGACY_CART_FILE):
+        lines_by_user.setdefault(line['user_id'], []).append(line)
+
+    for user_id, lines in lines_by_user.items():
+        cart = load_cart(user_id)
+        for line in lines:
+            cart[line['product_id']] = line
+        save_cart(user_id, cart)
+
+    os.remove(legacy_path)
+    return sum(len(lines) for lines in lines_by_user.values())
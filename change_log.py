@@ -0,0 +1,224 @@
+"""
+Append-only change log (change-data feed)
+Every order/product/cart mutation appends one JSON line to change_log.jsonl
+with a monotonically increasing sequence number, so consumers can sync with
+GET /api/changes?since=<seq> instead of re-reading whole collections.
+
+Reads seek via a sparse in-memory (seq -> byte offset) index that is extended
+as the file grows, so a poll only reads the lines after `since`.
+
+compact_change_log() drops entries past CHANGE_LOG_RETENTION or beyond
+CHANGE_LOG_MAX_BYTES (run by the maintenance script, and automatically once
+the log outgrows the size cap). The file is replaced atomically and keeps its
+sequence numbers; readers notice the new file and rebuild their index once.
+Consumers whose `since` is older than first_seq() have missed entries.
+"""
+
+import bisect
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime
+
+from config import Config
+from utils import file_lock
+
+CHANGE_LOG_FILE = 'change_log.jsonl'
+CHECKPOINT_EVERY = 256  # Lines between index checkpoints
+
+# Last sequence number written, valid while the file still has this inode and size
+_tail = {'file': None, 'seq': 0}
+
+# Sparse index over the file (identified by inode): seqs[i] starts at byte offsets[i]
+_index = {'inode': None, 'size': 0, 'lines': 0, 'seqs': [], 'offsets': []}
+_index_guard = threading.Lock()
+
+
+def _path():
+    return os.path.join(Config.DATA_DIR, CHANGE_LOG_FILE)
+
+
+def _file_id():
+    """(inode, size) of the log, (None, 0) if it doesn't exist yet"""
+    try:
+        stat = os.stat(_path())
+    except FileNotFoundError:
+        return None, 0
+    return stat.st_ino, stat.st_size
+
+
+def _last_seq(file_id):
+    """Sequence number of the last line (reads only the end of the file)"""
+    if file_id == _tail['file']:
+        return _tail['seq']
+    size = file_id[1]
+    if size == 0:
+        return 0
+
+    with open(_path(), 'rb') as f:
+        block = 4096
+        while True:
+            start = max(0, size - block)
+            f.seek(start)
+            lines = f.read(size - start).splitlines()
+            if len(lines) > 1 or start == 0:
+                return json.loads(lines[-1])['seq']
+            block *= 2
+
+
+def record_changes(changes):
+    """Append [(entity, entity_id, action, data)]; returns the last sequence number
+
+    data is the document after the change (None for deletions).
+    """
+    if not changes:
+        return None
+
+    with file_lock(CHANGE_LOG_FILE):
+        seq = _last_seq(_file_id())
+        now = datetime.now().isoformat()
+        lines = []
+        for entity, entity_id, action, data in changes:
+            seq += 1
+            lines.append(json.dumps({
+                'seq': seq,
+                'entity': entity,
+                'entity_id': entity_id,
+                'action': action,
+                'data': data,
+                'at': now
+            }, ensure_ascii=False))
+
+        os.makedirs(Config.DATA_DIR, exist_ok=True)
+        with open(_path(), 'a', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+        _tail['file'], _tail['seq'] = _file_id(), seq
+        if _tail['file'][1] > Config.CHANGE_LOG_MAX_BYTES:
+            compact_change_log()
+    return seq
+
+
+def record_change(entity, entity_id, action, data=None):
+    """Append a single change; returns its sequence number"""
+    return record_changes([(entity, entity_id, action, data)])
+
+
+def _sync_index(f, stat):
+    """Extend the checkpoint index over lines appended since the last read of open file f"""
+    if stat.st_ino != _index['inode'] or stat.st_size < _index['size']:
+        # Log was compacted or truncated (e.g. by clear_data.py); start over
+        _index.update(inode=stat.st_ino, size=0, lines=0, seqs=[], offsets=[])
+    if stat.st_size == _index['size']:
+        return
+
+    f.seek(_index['size'])
+    offset = _index['size']
+    for line in f:
+        if not line.endswith(b'\n'):
+            break  # Partially written line; pick it up next time
+        if _index['lines'] % CHECKPOINT_EVERY == 0:
+            _index['seqs'].append(json.loads(line)['seq'])
+            _index['offsets'].append(offset)
+        _index['lines'] += 1
+        offset += len(line)
+    _index['size'] = offset
+
+
+def _open():
+    try:
+        return open(_path(), 'rb')
+    except FileNotFoundError:
+        return None
+
+
+def first_seq():
+    """Sequence number of the oldest entry still in the log (None if it is empty)"""
+    f = _open()
+    if f is None:
+        return None
+    with f, _index_guard:
+        _sync_index(f, os.fstat(f.fileno()))
+        return _index['seqs'][0] if _index['seqs'] else None
+
+
+def changes_since(since=0, limit=100, entity=None):
+    """Changes with seq > since (oldest first), optionally for one entity type
+
+    Returns (changes, last_seq, has_more); last_seq is the cursor for the next call.
+    """
+    f = _open()
+    if f is None:
+        return [], since, False
+
+    # One handle for indexing and reading, so a concurrent compaction can't mix up offsets
+    with f:
+        with _index_guard:
+            _sync_index(f, os.fstat(f.fileno()))
+            # Start at the last checkpoint at or before `since`
+            i = bisect.bisect_right(_index['seqs'], since) - 1
+            start = _index['offsets'][i] if i >= 0 else 0
+            end = _index['size']
+
+        changes = []
+        last_seq = since
+        f.seek(start)
+        while f.tell() < end:
+            change = json.loads(f.readline())
+            if change['seq'] <= since:
+                continue
+            if entity and change['entity'] != entity:
+                last_seq = change['seq']
+                continue
+            if len(changes) == limit:
+                return changes, last_seq, True
+            changes.append(change)
+            last_seq = change['seq']
+    return changes, last_seq, False
+
+
+def compact_change_log(retention=None, max_bytes=None):
+    """Drop entries older than retention (timedelta) and the oldest beyond max_bytes
+
+    An oversized log is trimmed to 3/4 of max_bytes so appends don't trigger
+    another compaction right away. The newest entry is always kept so sequence
+    numbers carry on. Returns (entries kept, entries dropped).
+    """
+    retention = retention or Config.CHANGE_LOG_RETENTION
+    max_bytes = max_bytes or Config.CHANGE_LOG_MAX_BYTES
+    cutoff = (datetime.now() - retention).isoformat()
+
+    with file_lock(CHANGE_LOG_FILE):
+        f = _open()
+        if f is None:
+            return 0, 0
+        with f:
+            lines = [line for line in f if line.endswith(b'\n')]
+
+        total = len(lines)
+        kept = [line for line in lines[:-1] if json.loads(line)['at'] >= cutoff] + lines[-1:]
+        size = sum(len(line) for line in kept)
+        start = 0
+        if size > max_bytes:
+            while size > max_bytes * 3 // 4 and start < len(kept) - 1:
+                size -= len(kept[start])
+                start += 1
+        kept = kept[start:]
+        if len(kept) == total:
+            return total, 0
+
+        fd, tmp_path = tempfile.mkstemp(dir=Config.DATA_DIR, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                out.writelines(kept)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp_path, _path())
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        _tail['file'] = None
+    return len(kept), total - len(kept)
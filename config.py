@@ -2,11 +2,24 @@ import os
 from datetime import timedelta
 # Central place for all application settings and keys. 🔑
 
+
+def _rate_limit(name, requests, per_seconds):
+    """(requests, per seconds) for a route, overridable as RATE_LIMIT_<NAME>=requests/seconds"""
+    value = os.environ.get(f'RATE_LIMIT_{name.upper()}')
+    if not value:
+        return requests, per_seconds
+    requests, per_seconds = value.split('/')
+    return int(requests), int(per_seconds)
+
+
 class Config:
     """Application configuration"""
 
     _BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
+    # 'production' switches on protections that get in the way of test suites (rate limits)
+    APP_ENV = os.environ.get('APP_ENV', 'development')
+
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'your-secret-key-change-in-production'
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'your-jwt-secret-key-change-in-production'
     
@@ -19,6 +32,75 @@ class Config:
     # Refresh tokens allow users to get new access tokens without re-login
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)  # 30 days
 
+    # Verified token payloads cached per token (never past the token's exp)
+    TOKEN_CACHE_SIZE = 1024
+    TOKEN_CACHE_TTL = timedelta(minutes=5)
+
+    # Password hashing: 'bcrypt' (auth_bcrypt.py) or the legacy 'sha256' (auth.py)
+    # With bcrypt, SHA256 hashes are upgraded on each user's next login
+    # Pick BCRYPT_ROUNDS with Cleanup-Maintenance Scripts/calibrate_bcrypt.py
+    PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'bcrypt')
+    BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+    # bcrypt runs in a process pool; requests beyond MAX_PENDING get 503
+    PASSWORD_POOL_WORKERS = int(os.environ.get('PASSWORD_POOL_WORKERS', os.cpu_count() or 2))
+    PASSWORD_POOL_MAX_PENDING = int(os.environ.get('PASSWORD_POOL_MAX_PENDING', 32))
+    PASSWORD_HASH_TIMEOUT = 10  # seconds
+
+    # Token-bucket rate limits (rate_limit.py): route name -> (requests, per seconds)
+    # On by default only in production: the Postman/REST-Assured suites register and
+    # log in many users from one address. RATE_LIMIT_ENABLED=1/0 forces it either way.
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1' if APP_ENV == 'production' else '0') != '0'
+    RATE_LIMITS = {
+        'login': _rate_limit('login', 10, 60),
+        'register': _rate_limit('register', 5, 900),
+        'contact': _rate_limit('contact', 5, 600),
+        'help_helpful': _rate_limit('help_helpful', 20, 60),
+        'notifications_test_create': _rate_limit('notifications_test_create', 10, 60),
+        'events': _rate_limit('events', 120, 60)
+    }
+    RATE_LIMIT_IDLE_SECONDS = 24 * 3600  # Buckets unused this long are pruned
+
+    # Change feed (change_log.py): entries older than the retention are dropped by
+    # Cleanup-Maintenance Scripts/compact_change_log.py; past MAX_BYTES the log is
+    # compacted automatically, oldest entries first
+    CHANGE_LOG_RETENTION = timedelta(days=int(os.environ.get('CHANGE_LOG_RETENTION_DAYS', 30)))
+    CHANGE_LOG_MAX_BYTES = 64 * 1024 * 1024
+
+    # Stock held for a cart during checkout before it is released automatically
+    STOCK_RESERVATION_EXPIRES = timedelta(minutes=15)
+
+    # Idempotency-Key responses are replayed for this long (oldest evicted past the cap)
+    IDEMPOTENCY_KEY_EXPIRES = timedelta(hours=24)
+    IDEMPOTENCY_MAX_KEYS = 10000
+
+    # Background task queue (tasks.py); TASKS_ASYNC=0 runs handlers inline
+    TASK_WORKERS = int(os.environ.get('TASK_WORKERS', 4))
+    TASKS_ASYNC = os.environ.get('TASKS_ASYNC', '1') != '0'
+    TASK_MAX_ATTEMPTS = 3
+    # Job files not touched for this long are assumed orphaned by a crashed worker; live
+    # workers touch the files of their queued jobs every TASK_RECOVERY_INTERVAL (keep it shorter)
+    TASK_RECOVERY_AGE = timedelta(minutes=5)
+    TASK_RECOVERY_INTERVAL = timedelta(minutes=1)  # How often live workers look for them
+    TASK_EFFECT_RETENTION = timedelta(days=30)  # How long applied side-effect keys are remembered
+
+    # Traffic counters (event_counters.py): buffered in memory, flushed every N seconds
+    EVENT_FLUSH_INTERVAL = int(os.environ.get('EVENT_FLUSH_INTERVAL', 10))
+    EVENT_COUNTER_SHARDS = 16
+    # Event types clients may send to POST /api/events (product/blog views are counted server-side)
+    CLIENT_EVENT_TYPES = ('page_view', 'search', 'click')
+    EVENT_BATCH_MAX = 50
+    # Page views must name a page of this app; search/click labels are capped in length,
+    # and each day keeps per-key counts for at most N distinct keys per event type
+    EVENT_LABEL_MAX_LENGTH = 100
+    EVENT_MAX_KEYS_PER_DAY = 1000
+    # Unique visitors (HyperLogLog, ~2% error at precision 11) and popular products
+    # (count-min top-K of views and ordered quantities, decayed by half every N days)
+    VISITOR_HLL_PRECISION = 11
+    VISITOR_DAYS_KEPT = 90
+    TOP_K_SIZE = 50
+    TOP_K_HALF_LIFE_DAYS = 14
+    POPULAR_ORDER_WEIGHT = 10  # One unit ordered counts like this many views
+
     # JSON database settings
     DATA_DIR = os.environ.get('DATA_DIR') or os.path.join(_BASE_DIR, 'data')
 
@@ -0,0 +1,366 @@
+"""
+Buffered traffic counters (page views, product views, blog views, UI events)
+record_event() only bumps an in-memory counter: counters are split into shards
+(picked by thread) so request threads rarely contend on the same lock. A
+background thread flushes the shards every EVENT_FLUSH_INTERVAL seconds into
+per-day rollups in traffic_rollups.json (and blog view counts into
+blog_posts.json), so an event never costs a file write of its own. Each worker
+process flushes its own shards; the merge happens under the file lock.
+
+The same flush folds sketches into traffic_sketches.json: one HyperLogLog per
+day for unique visitors, decayed count-min top-K trackers for product views
+and ordered quantities, and the "popular products" ranking taken from them.
+
+A write that fails keeps its counts (and visitor sketches) for the next flush;
+each target (sketches, rollups, blog posts) has its own backlog, so a retry
+never counts twice into a target that was already written.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+from config import Config
+from sketches import HyperLogLog, CountMinSketch, TopK
+from utils import load_json, save_json, load_json_cached, file_lock
+
+TRAFFIC_FILE = 'traffic_rollups.json'
+SKETCH_FILE = 'traffic_sketches.json'
+MAX_KEY_LENGTH = 200
+TOP_K_KINDS = ('product_view', 'product_order')
+# Quantities of cancelled orders, subtracted from the ordered estimate when ranking
+CANCEL_KIND = 'product_cancel'
+# Ordered quantities have their own daily rollups (sales_rollups.py)
+SKETCH_ONLY_KINDS = ('product_order', CANCEL_KIND)
+
+_shards = [(threading.Lock(), Counter()) for _ in range(Config.EVENT_COUNTER_SHARDS)]
+_visitors = {}  # day -> HyperLogLog of visitors seen by this process since the last flush
+_visitors_guard = threading.Lock()
+_unflushed = {}  # flush target -> (counts, visitors) whose write failed, retried by the next flush
+_unflushed_guard = threading.Lock()
+_flusher = None
+_flusher_guard = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+def record_event(kind, key=None, count=1):
+    """Count an event of kind (e.g. 'product_view', 5) for today"""
+    counter_key = (date.today().isoformat(), kind, str(key)[:MAX_KEY_LENGTH] if key is not None else None)
+    lock, counts = _shards[threading.get_ident() % len(_shards)]
+    with lock:
+        counts[counter_key] += count
+    _start_flusher()
+
+
+def record_visitor(visitor):
+    """Count a visitor id (user id, or address + user agent) towards today's unique visitors"""
+    day = date.today().isoformat()
+    with _visitors_guard:
+        hll = _visitors.get(day)
+        if hll is None:
+            hll = _visitors[day] = HyperLogLog(Config.VISITOR_HLL_PRECISION)
+        hll.add(visitor)
+    _start_flusher()
+
+
+def pending_count(kind, key=None):
+    """Events of kind/key counted in this process but not flushed yet"""
+    key = str(key) if key is not None else None
+    total = 0
+    for lock, counts in _shards:
+        with lock:
+            total += sum(n for (_, k, name), n in counts.items() if k == kind and name == key)
+    with _unflushed_guard:
+        if 'blog_posts' in _unflushed and kind == 'blog_view':
+            total += sum(n for (_, k, name), n in _unflushed['blog_posts'][0].items() if k == kind and name == key)
+    return total
+
+
+def _drain():
+    """Take every shard's counts and the visitor sketches, leaving them empty"""
+    global _visitors
+    drained = Counter()
+    for lock, counts in _shards:
+        with lock:
+            drained.update(counts)
+            counts.clear()
+    with _visitors_guard:
+        visitors, _visitors = _visitors, {}
+    return drained, visitors
+
+
+def _merge_visitors(into, visitors):
+    for day, hll in visitors.items():
+        if day in into:
+            into[day].merge(hll)
+        else:
+            into[day] = hll
+
+
+def _keep_unflushed(target, counts, visitors):
+    """Hold counts whose write failed until the next flush"""
+    with _unflushed_guard:
+        kept_counts, kept_visitors = _unflushed.setdefault(target, (Counter(), {}))
+        kept_counts.update(counts)
+        _merge_visitors(kept_visitors, visitors)
+
+
+def _seed_rollups():
+    """Start from the seeded daily page views in analytics.json"""
+    analytics = load_json('analytics.json')
+    days = {}
+    for entry in analytics.get('page_views', []) if isinstance(analytics, dict) else []:
+        days[entry['date']] = {'page_view': {'total': entry['views'], 'by_key': {}}}
+    return {'day': days}
+
+
+def _seed_sketches():
+    """Top-K trackers primed with the seeded popular products and past orders"""
+    views = TopK(Config.TOP_K_SIZE)
+    analytics = load_json('analytics.json')
+    seeded = analytics.get('popular_products', []) if isinstance(analytics, dict) else []
+    views.add_counts({str(p['product_id']): p['views'] for p in seeded})
+
+    ordered = Counter()
+    for order in load_json('orders.json'):
+        if order['status'] != 'cancelled':
+            for item in order.get('items', []):
+                ordered[str(item['product_id'])] += item['quantity']
+    orders = TopK(Config.TOP_K_SIZE)
+    orders.add_counts(ordered)
+
+    return {'decayed_on': date.today().isoformat(), 'visitors': {},
+            'top': {'product_view': views.to_json(), 'product_order': orders.to_json()},
+            'cancelled': CountMinSketch().to_json()}
+
+
+def _counts_of(drained, kind):
+    counts = Counter()
+    for (_, event_kind, key), n in drained.items():
+        if event_kind == kind and key is not None:
+            counts[key] += n
+    return counts
+
+
+def _flush_sketches(drained, visitors):
+    with file_lock(SKETCH_FILE):
+        data = load_json(SKETCH_FILE)
+        if not isinstance(data, dict) or 'top' not in data:
+            data = _seed_sketches()
+
+        for day, hll in visitors.items():
+            if day in data['visitors']:
+                hll.merge(HyperLogLog.from_json(data['visitors'][day], Config.VISITOR_HLL_PRECISION))
+            data['visitors'][day] = hll.to_json()
+        oldest = (date.today() - timedelta(days=Config.VISITOR_DAYS_KEPT)).isoformat()
+        data['visitors'] = {day: v for day, v in data['visitors'].items() if day >= oldest}
+
+        # Halve the weight of past activity every TOP_K_HALF_LIFE_DAYS
+        elapsed = (date.today() - date.fromisoformat(data['decayed_on'])).days
+        factor = 0.5 ** (elapsed / Config.TOP_K_HALF_LIFE_DAYS)
+        trackers = {}
+        for kind in TOP_K_KINDS:
+            tracker = trackers[kind] = TopK.from_json(data['top'][kind], Config.TOP_K_SIZE)
+            if elapsed > 0:
+                tracker.decay(factor)
+            tracker.add_counts(_counts_of(drained, kind))
+            data['top'][kind] = tracker.to_json()
+
+        # Count-min only stays an upper bound with non-negative updates, so
+        # cancellations go into a sketch of their own (decayed alike)
+        cancelled = CountMinSketch.from_json(data['cancelled']) if 'cancelled' in data else CountMinSketch()
+        if elapsed > 0:
+            cancelled.scale(factor)
+        for key, n in _counts_of(drained, CANCEL_KIND).items():
+            cancelled.add(key, n)
+        data['cancelled'] = cancelled.to_json()
+        data['decayed_on'] = date.today().isoformat()
+        # Ranked once per flush, so readers only slice it
+        data['popular'] = _rank_popular(trackers, cancelled)
+
+        save_json(SKETCH_FILE, data)
+
+
+def _flush_rollups(drained, visitors):
+    with file_lock(TRAFFIC_FILE):
+        rollups = load_json(TRAFFIC_FILE)
+        if not isinstance(rollups, dict) or 'day' not in rollups:
+            rollups = _seed_rollups()
+        for (day, kind, key), n in drained.items():
+            if kind in SKETCH_ONLY_KINDS:
+                continue
+            entry = rollups['day'].setdefault(day, {}).setdefault(kind, {'total': 0, 'by_key': {}})
+            entry['total'] += n
+            if key is not None and (key in entry['by_key'] or len(entry['by_key']) < Config.EVENT_MAX_KEYS_PER_DAY):
+                entry['by_key'][key] = entry['by_key'].get(key, 0) + n
+        save_json(TRAFFIC_FILE, rollups)
+
+
+def _flush_blog_views(drained, visitors):
+    blog_views = Counter()
+    for (_, kind, key), n in drained.items():
+        if kind == 'blog_view':
+            blog_views[int(key)] += n
+    if blog_views:
+        with file_lock('blog_posts.json'):
+            posts = load_json('blog_posts.json')
+            for post in posts:
+                if post['id'] in blog_views:
+                    post['views'] = post.get('views', 0) + blog_views[post['id']]
+            save_json('blog_posts.json', posts)
+
+
+# target -> writer; only the sketches take the visitor HLLs
+FLUSH_TARGETS = {
+    'sketches': _flush_sketches,
+    'rollups': _flush_rollups,
+    'blog_posts': _flush_blog_views
+}
+
+
+def flush_events():
+    """Merge buffered counts into the rollups and sketches; returns the number of events flushed"""
+    drained, visitors = _drain()
+    with _unflushed_guard:
+        backlog = dict(_unflushed)
+        _unflushed.clear()
+    if not drained and not visitors and not backlog:
+        return 0
+
+    for target, write in FLUSH_TARGETS.items():
+        counts, target_visitors = backlog.get(target, (Counter(), {}))
+        counts.update(drained)
+        if target == 'sketches':
+            _merge_visitors(target_visitors, visitors)
+        if not counts and not target_visitors:
+            continue
+        try:
+            write(counts, target_visitors)
+        except Exception:
+            logger.exception('Event flush to %s failed, keeping its counts for the next flush', target)
+            _keep_unflushed(target, counts, target_visitors)
+
+    return sum(drained.values())
+
+
+def _flush_loop():
+    while True:
+        time.sleep(Config.EVENT_FLUSH_INTERVAL)
+        try:
+            flush_events()
+        except Exception:
+            logger.exception('Event flush failed')
+
+
+def _start_flusher():
+    global _flusher
+    if _flusher is not None:
+        return
+    with _flusher_guard:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, name='event-flush', daemon=True)
+            _flusher.start()
+
+
+# Counts still buffered at shutdown are written out
+atexit.register(flush_events)
+
+
+def _decode(data):
+    if not isinstance(data, dict) or 'day' not in data:
+        return _seed_rollups()
+    return data
+
+
+def _rollups():
+    return load_json_cached(TRAFFIC_FILE, _decode)
+
+
+def traffic_series(start, end):
+    """[(day, {kind: total})] for every day from start to end (dates, inclusive)"""
+    days = _rollups()['day']
+    series = []
+    day = start
+    while day <= end:
+        bucket = days.get(day.isoformat(), {})
+        series.append((day.isoformat(), {kind: entry['total'] for kind, entry in bucket.items()}))
+        day += timedelta(days=1)
+    return series
+
+
+def top_keys(kind, start, end, limit=10):
+    """[(key, count)] with the most events of kind between start and end (dates, inclusive)"""
+    days = _rollups()['day']
+    totals = Counter()
+    day = start
+    while day <= end:
+        entry = days.get(day.isoformat(), {}).get(kind)
+        if entry:
+            totals.update(entry['by_key'])
+        day += timedelta(days=1)
+    return totals.most_common(limit)
+
+
+def _rank_popular(top, cancelled):
+    """[{'product_id', 'views', 'orders', 'score'}] by recent views + ORDER_WEIGHT * ordered quantity
+
+    Ordered quantities are net of cancellations.
+    """
+    views, orders = top['product_view'], top['product_order']
+    candidates = {key for key, _ in views.top()} | {key for key, _ in orders.top()}
+    ranked = []
+    for key in candidates:
+        view_count = views.sketch.estimate(key)
+        order_count = max(0.0, orders.sketch.estimate(key) - cancelled.estimate(key))
+        ranked.append({
+            'product_id': int(key),
+            'views': int(round(view_count)),
+            'orders': int(round(order_count)),
+            'score': round(view_count + Config.POPULAR_ORDER_WEIGHT * order_count, 2)
+        })
+    ranked.sort(key=lambda p: p['score'], reverse=True)
+    return ranked
+
+
+def _decode_sketches(data):
+    if not isinstance(data, dict) or 'top' not in data:
+        data = _seed_sketches()
+    top = {kind: TopK.from_json(data['top'][kind], Config.TOP_K_SIZE) for kind in TOP_K_KINDS}
+    cancelled = CountMinSketch.from_json(data['cancelled']) if 'cancelled' in data else CountMinSketch()
+    return {
+        'visitors': {day: HyperLogLog.from_json(v, Config.VISITOR_HLL_PRECISION) for day, v in data['visitors'].items()},
+        'top': top,
+        # Files written before the ranking was stored get it computed once here
+        'popular': data['popular'] if 'popular' in data else _rank_popular(top, cancelled)
+    }
+
+
+def _sketches():
+    return load_json_cached(SKETCH_FILE, _decode_sketches)
+
+
+def unique_visitors(start, end):
+    """([(day, estimated visitors)], estimated distinct visitors over the whole range)"""
+    days = _sketches()['visitors']
+    series = []
+    merged = HyperLogLog(Config.VISITOR_HLL_PRECISION)
+    day = start
+    while day <= end:
+        hll = days.get(day.isoformat())
+        series.append((day.isoformat(), hll.count() if hll else 0))
+        if hll:
+            merged.merge(hll)
+        day += timedelta(days=1)
+    return series, merged.count()
+
+
+def popular_products(limit=10):
+    """Top products as ranked at the last flush (see _rank_popular); limit=None for all of them
+
+    Deleted products may still be listed, so callers over-fetch and filter.
+    """
+    return _sketches()['popular'][:limit]
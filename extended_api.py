@@ -5,41 +5,23 @@ This file contains advanced features and endpoints
 """
 
 from flask import Flask, jsonify, request
-from functools import wraps
+from werkzeug.exceptions import HTTPException
 import json
 import os
 from datetime import datetime, timedelta
 import random
-from auth import generate_token, verify_token, hash_password, verify_password
-from utils import load_json, save_json, get_next_id, validate_email
-
-# Import decorators from app.py
-def token_required(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        
-        if not token:
-            return jsonify({'success': False, 'error': 'Token is missing'}), 401
-        
-        if token.startswith('Bearer '):
-            token = token[7:]
-        
-        user_data = verify_token(token)
-        if not user_data:
-            return jsonify({'success': False, 'error': 'Token is invalid or expired'}), 401
-        
-        return f(user_data, *args, **kwargs)
-    
-    return decorated
-
-def admin_required(f):
-    @wraps(f)
-    def decorated(user_data, *args, **kwargs):
-        if not user_data.get('is_admin', False):
-            return jsonify({'success': False, 'error': 'Admin privileges required'}), 403
-        return f(user_data, *args, **kwargs)
-    return decorated
+from auth_decorators import token_required, admin_required, verify_token_cached
+from utils import load_json, save_json, load_json_cached, locked, get_next_id, build_index, build_lookup, validate_email
+from idempotency import idempotent
+from config import Config
+from rate_limit import rate_limited
+from order_store import orders_between, order_timestamp
+from sales_rollups import UNITS as SALES_UNITS, sales_series, period_totals, empty_bucket, merge_bucket
+from stats_store import get_stats_counters
+from event_counters import (record_event, pending_count, traffic_series, top_keys,
+                            unique_visitors as get_unique_visitors, popular_products as get_popular_products)
+from analytics_engine import run_query, GROUPS as QUERY_GROUPS, SORT_FIELDS as QUERY_SORT_FIELDS
+from recommendations import also_bought, similar_products, get_user_recommendation_ids, rebuild_copurchase, refresh_all_user_recommendations
 
 # ============== HELP & FAQ SYSTEM ==============
 
@@ -100,6 +82,7 @@ def help_routes(app):
     
 
     @app.route('/api/help/<int:help_id>/helpful', methods=['POST'])
+    @rate_limited('help_helpful')
     def mark_helpful(help_id):
         """Mark help article as helpful (one-time per user)"""
         help_data = load_json('help.json')
@@ -116,9 +99,8 @@ def help_routes(app):
         user_identifier = request.remote_addr
         if request.headers.get('Authorization'):
             try:
-                from auth import verify_token
                 token = request.headers.get('Authorization').replace('Bearer ', '')
-                user_data = verify_token(token)
+                user_data = verify_token_cached(token)
                 if user_data:
                     user_identifier = f"user_{user_data['id']}"
             except:
@@ -207,6 +189,7 @@ def contact_routes(app):
     """Contact system routes"""
     
     @app.route('/api/contact', methods=['POST'])
+    @rate_limited('contact')
     def submit_contact_message():
         """Submit contact message"""
         data = request.get_json()
@@ -408,6 +391,7 @@ def coupon_routes(app):
     
     @app.route('/api/coupons/validate', methods=['POST'])
     @token_required
+    @idempotent
     def validate_coupon(user_data):
         """Validate coupon code"""
         data = request.get_json()
@@ -533,6 +517,7 @@ def notification_routes(app):
     
     @app.route('/api/notifications/<int:notification_id>/read', methods=['PUT'])
     @token_required
+    @locked('notifications.json')
     def mark_notification_read(user_data, notification_id):
         """Mark notification as read"""
         notifications = load_json('notifications.json')
@@ -558,6 +543,7 @@ def notification_routes(app):
     
     @app.route('/api/notifications/read-all', methods=['PUT'])
     @token_required
+    @locked('notifications.json')
     def mark_all_notifications_read(user_data):
         """Mark all user notifications as read"""
         user_id = user_data['id']
@@ -579,7 +565,9 @@ def notification_routes(app):
         }), 200
 
     @app.route('/api/notifications/test-create', methods=['POST'])
+    @rate_limited('notifications_test_create')
     @token_required
+    @locked('notifications.json')
     def create_test_notifications(user_data):
         """Create random notifications for the authenticated user (testing only)"""
         data = request.get_json() or {}
@@ -629,6 +617,16 @@ def notification_routes(app):
 def analytics_routes(app):
     """Analytics and reporting routes"""
     
+    def is_page_path(path):
+        """Whether a page view path names one of the app's pages (not the API or static files)"""
+        if path.startswith(('/api/', '/static/')):
+            return False
+        try:
+            app.url_map.bind('localhost').match(path, method='GET')
+        except HTTPException:
+            return False
+        return True
+    
     @app.route('/api/analytics/dashboard', methods=['GET'])
     @token_required
     @admin_required
@@ -636,21 +634,23 @@ def analytics_routes(app):
         """Get dashboard analytics (Admin only)"""
         analytics_data = load_json('analytics.json')
         
-        # Calculate additional metrics
-        users = load_json('users.json')
-        products = load_json('products.json')
-        orders = load_json('orders.json')
-        
-        # Sales metrics
-        total_revenue = sum(o['total_amount'] for o in orders if o['status'] != 'cancelled')
-        monthly_revenue = sum(o['total_amount'] for o in orders 
-                           if o['status'] != 'cancelled' and 
-                           datetime.fromisoformat(o['created_at']).month == datetime.now().month)
-        
-        # Popular products
+        # Totals and sales come from materialized counters and rollups
+        stats = get_stats_counters()
+        today = datetime.now().date()
+        monthly_revenue = period_totals('month', today)['revenue']
+        sales_data = [{'date': day, 'sales': bucket['revenue'], 'orders': bucket['orders']}
+                      for day, bucket in sales_series('day', today - timedelta(days=6), today)]
+        page_views_data = [{'date': day, 'views': totals.get('page_view', 0)}
+                           for day, totals in traffic_series(today - timedelta(days=6), today)]
+        
+        # Popular products (live top-K of recent views and orders)
+        product_map = load_json_cached('products.json', build_lookup)
         popular_products = []
-        for pop_product in analytics_data['popular_products']:
-            product = next((p for p in products if p['id'] == pop_product['product_id']), None)
+        # Over-fetch: deleted products are skipped
+        for pop_product in get_popular_products(limit=None):
+            if len(popular_products) == 10:
+                break
+            product = product_map.get(pop_product['product_id'])
             if product:
                 popular_products.append({
                     'product': product,
@@ -661,14 +661,14 @@ def analytics_routes(app):
         return jsonify({
             'success': True,
             'data': {
-                'total_users': len(users),
-                'total_products': len(products),
-                'total_orders': len(orders),
-                'total_revenue': total_revenue,
+                'total_users': stats['total_users'],
+                'total_products': stats['total_products'],
+                'total_orders': stats['total_orders'],
+                'total_revenue': stats['total_revenue'],
                 'monthly_revenue': monthly_revenue,
                 'popular_products': popular_products,
-                'page_views_data': analytics_data['page_views'][-7:],  # Last 7 days
-                'sales_data': analytics_data['sales_data'][-7:],  # Last 7 days
+                'page_views_data': page_views_data,  # Last 7 days, oldest first
+                'sales_data': sales_data,  # Last 7 days, oldest first
                 'user_registrations': analytics_data['user_registrations'][-7:]  # Last 7 days
             }
         }), 200
@@ -677,19 +677,23 @@ def analytics_routes(app):
     @token_required
     @admin_required
     def get_sales_report(user_data):
-        """Get sales report with date filtering"""
+        """Get sales report with date filtering (group_by=day|week|month for a rollup series)"""
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
+        group_by = request.args.get('group_by')
         
-        orders = load_json('orders.json')
+        if group_by:
+            return sales_report_from_rollups(start_date, end_date, group_by)
         
         if start_date and end_date:
-            start_dt = datetime.fromisoformat(start_date)
-            end_dt = datetime.fromisoformat(end_date)
-            filtered_orders = [o for o in orders 
-                             if start_dt <= datetime.fromisoformat(o['created_at']) <= end_dt]
+            try:
+                start_dt = datetime.fromisoformat(start_date)
+                end_dt = datetime.fromisoformat(end_date)
+            except ValueError:
+                return jsonify({'success': False, 'error': 'Invalid date format, use ISO 8601'}), 400
+            filtered_orders = orders_between(order_timestamp(start_dt), order_timestamp(end_dt))
         else:
-            filtered_orders = orders
+            filtered_orders = load_json('orders.json')
         
         # Calculate metrics
         total_sales = sum(o['total_amount'] for o in filtered_orders if o['status'] != 'cancelled')
@@ -723,6 +727,168 @@ def analytics_routes(app):
                 'orders': filtered_orders
             }
         }), 200
+    
+    @app.route('/api/analytics/query', methods=['GET'])
+    @token_required
+    @admin_required
+    def analytics_query(user_data):
+        """Ad-hoc revenue/orders/quantity report, optionally grouped (Admin only)"""
+        group_by = request.args.get('group_by')
+        if group_by not in QUERY_GROUPS:
+            return jsonify({'success': False, 'error': f'group_by must be one of: {", ".join(g for g in QUERY_GROUPS if g)}'}), 400
+        
+        sort = request.args.get('sort', 'revenue')
+        if sort not in QUERY_SORT_FIELDS:
+            return jsonify({'success': False, 'error': f'sort must be one of: {", ".join(QUERY_SORT_FIELDS)}'}), 400
+        
+        try:
+            limit = min(max(int(request.args['limit']), 1), 1000) if 'limit' in request.args else None
+            start_date = request.args.get('start_date')
+            end_date = request.args.get('end_date')
+            # Whole days: [start_date 00:00, day after end_date 00:00)
+            start_ts = order_timestamp(datetime.fromisoformat(start_date[:10])) if start_date else None
+            end_ts = order_timestamp(datetime.fromisoformat(end_date[:10]) + timedelta(days=1)) if end_date else None
+        except (ValueError, OverflowError):
+            return jsonify({'success': False, 'error': 'Invalid limit or date (use YYYY-MM-DD)'}), 400
+        
+        # Cancelled orders are left out unless statuses are given explicitly (status=all for everything)
+        status_param = request.args.get('status')
+        statuses = set(status_param.split(',')) if status_param and status_param != 'all' else None
+        exclude_statuses = {'cancelled'} if not status_param else None
+        
+        rows, totals = run_query(group_by, start_ts, end_ts, statuses, exclude_statuses, sort, limit)
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'group_by': group_by,
+                'filters': {
+                    'start_date': start_date,
+                    'end_date': end_date,
+                    'status': sorted(statuses) if statuses else status_param or 'all except cancelled'
+                },
+                'totals': totals,
+                'rows': rows
+            }
+        }), 200
+    
+    @app.route('/api/events', methods=['POST'])
+    @rate_limited('events')
+    def ingest_events():
+        """Record client-side traffic events: one event or {"events": [...]}"""
+        # sendBeacon posts as text/plain, so don't insist on a JSON content type
+        data = request.get_json(force=True, silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'success': False, 'error': 'JSON body required'}), 400
+        
+        events = data.get('events', [data])
+        if not isinstance(events, list) or not events or len(events) > Config.EVENT_BATCH_MAX:
+            return jsonify({'success': False, 'error': f'Send between 1 and {Config.EVENT_BATCH_MAX} events'}), 400
+        
+        keys = []
+        for event in events:
+            if not isinstance(event, dict) or event.get('type') not in Config.CLIENT_EVENT_TYPES:
+                return jsonify({'success': False, 'error': f'Event type must be one of: {", ".join(Config.CLIENT_EVENT_TYPES)}'}), 400
+            # Page views are keyed by path (without query string), other events by label
+            key = event.get('path' if event['type'] == 'page_view' else 'label')
+            if key is not None and not isinstance(key, str):
+                return jsonify({'success': False, 'error': 'Event path and label must be strings'}), 400
+            if event['type'] == 'page_view':
+                key = (key or '').split('?')[0]
+                if key and not is_page_path(key):
+                    return jsonify({'success': False, 'error': f'Unknown page path: {key[:Config.EVENT_LABEL_MAX_LENGTH]}'}), 400
+            elif key and len(key) > Config.EVENT_LABEL_MAX_LENGTH:
+                return jsonify({'success': False, 'error': f'Event label must be at most {Config.EVENT_LABEL_MAX_LENGTH} characters'}), 400
+            keys.append(key.strip() if key else None)
+        
+        for event, key in zip(events, keys):
+            record_event(event['type'], key or None)
+        
+        return jsonify({
+            'success': True,
+            'count': len(events)
+        }), 202
+    
+    @app.route('/api/analytics/traffic', methods=['GET'])
+    @token_required
+    @admin_required
+    def get_traffic_analytics(user_data):
+        """Daily traffic and unique visitors, most viewed products/pages (Admin only, last 7 days by default)"""
+        today = datetime.now().date()
+        try:
+            end_day = datetime.fromisoformat(request.args['end_date'][:10]).date() if 'end_date' in request.args else today
+            start_day = (datetime.fromisoformat(request.args['start_date'][:10]).date() if 'start_date' in request.args
+                         else end_day - timedelta(days=6))
+            limit = int(request.args.get('limit', 10))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Invalid limit or date (use YYYY-MM-DD)'}), 400
+        
+        if start_day > end_day or (end_day - start_day).days > 366:
+            return jsonify({'success': False, 'error': 'Date range must be between 1 and 367 days'}), 400
+        
+        product_map = load_json_cached('products.json', build_lookup)
+        top_products = []
+        for product_id, views in top_keys('product_view', start_day, end_day, limit):
+            product = product_map.get(int(product_id))
+            top_products.append({
+                'product_id': int(product_id),
+                'name': product['name'] if product else None,
+                'views': views
+            })
+        
+        visitors_by_day, unique_visitors = get_unique_visitors(start_day, end_day)
+        visitors_by_day = dict(visitors_by_day)
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'period': {'start_date': start_day.isoformat(), 'end_date': end_day.isoformat()},
+                'unique_visitors': unique_visitors,  # Distinct over the whole period (estimate)
+                'series': [{'date': day, 'unique_visitors': visitors_by_day[day], **totals}
+                           for day, totals in traffic_series(start_day, end_day)],
+                'top_products': top_products,
+                'top_pages': [{'path': path, 'views': views}
+                              for path, views in top_keys('page_view', start_day, end_day, limit)]
+            }
+        }), 200
+    
+    def sales_report_from_rollups(start_date, end_date, group_by):
+        """Sales report answered from the day/week/month rollups (no order scan)"""
+        if group_by not in SALES_UNITS:
+            return jsonify({'success': False, 'error': f'group_by must be one of: {", ".join(SALES_UNITS)}'}), 400
+        
+        try:
+            start_day = datetime.fromisoformat(start_date[:10]).date() if start_date else None
+            end_day = datetime.fromisoformat(end_date[:10]).date() if end_date else None
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Invalid date format, use YYYY-MM-DD'}), 400
+        
+        try:
+            series = sales_series(group_by, start_day, end_day)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        totals = empty_bucket()
+        for _, bucket in series:
+            merge_bucket(totals, bucket)
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'period': {
+                    'start_date': start_date,
+                    'end_date': end_date
+                },
+                'group_by': group_by,
+                'summary': {
+                    'total_sales': totals['revenue'],
+                    'total_orders': totals['orders'],
+                    'cancelled_orders': totals['cancelled'],
+                    'average_order_value': totals['revenue'] / totals['orders'] if totals['orders'] > 0 else 0
+                },
+                'sales_by_status': totals['by_status'],
+                'series': [dict(bucket, period=key) for key, bucket in series]
+            }
+        }), 200
 
 # ============== ADVANCED SEARCH ==============
 
@@ -805,73 +971,83 @@ def recommendation_routes(app):
     @app.route('/api/recommendations/<int:product_id>', methods=['GET'])
     def get_product_recommendations(product_id):
         """Get recommended products based on a product"""
+        strategy = request.args.get('strategy', 'hybrid')
+        valid_strategies = ['hybrid', 'also_bought', 'content', 'category']
+        if strategy not in valid_strategies:
+            return jsonify({'success': False, 'error': f'Invalid strategy. Allowed: {", ".join(valid_strategies)}'}), 400
+        
         products = load_json('products.json')
-        target_product = next((p for p in products if p['id'] == product_id), None)
+        product_index = build_index(products)
         
-        if not target_product:
+        if product_id not in product_index:
             return jsonify({'success': False, 'error': 'Product not found'}), 404
         
-        # Simple recommendation: same category, different products
-        category_products = [p for p in products 
-                           if p['category'] == target_product['category'] and p['id'] != product_id]
-        
-        # Sort by price similarity (simple algorithm)
-        target_price = target_product.get('price', 0)
-        category_products.sort(key=lambda x: abs(x.get('price', 0) - target_price))
-        
-        # Return top 5 recommendations
-        recommendations = category_products[:5]
+        target_product = products[product_index[product_id]]
+        
+        candidate_ids = []
+        # Customers also bought (precomputed co-purchase neighbours)
+        if strategy in ['hybrid', 'also_bought']:
+            candidate_ids += [pid for pid, _ in also_bought(product_id)]
+        # Similar name/description/category (TF-IDF), covers products without orders
+        if strategy in ['hybrid', 'content']:
+            candidate_ids += [pid for pid, _ in similar_products(product_id)]
+        
+        recommendations = []
+        seen = {product_id}
+        for pid in candidate_ids:
+            if len(recommendations) >= 5:
+                break
+            if pid in product_index and pid not in seen:
+                seen.add(pid)
+                recommendations.append(products[product_index[pid]])
+        
+        # Fill remaining slots: same category, different products
+        if strategy in ['hybrid', 'category'] and len(recommendations) < 5:
+            category_products = [p for p in products 
+                               if p['category'] == target_product['category'] and p['id'] not in seen]
+            
+            # Sort by price similarity (simple algorithm)
+            target_price = target_product.get('price', 0)
+            category_products.sort(key=lambda x: abs(x.get('price', 0) - target_price))
+            recommendations += category_products[:5 - len(recommendations)]
         
         return jsonify({
             'success': True,
             'data': recommendations,
-            'count': len(recommendations)
+            'count': len(recommendations),
+            'strategy': strategy
         }), 200
     
     @app.route('/api/recommendations/user/<int:user_id>', methods=['GET'])
     def get_user_recommendations(user_id):
-        """Get personalized recommendations for user"""
-        # Get user's order history
-        orders = load_json('orders.json')
-        user_orders = [o for o in orders if o['user_id'] == user_id and o['status'] != 'cancelled']
-        
-        if not user_orders:
-            # No order history, return popular products
-            products = load_json('products.json')
-            analytics = load_json('analytics.json')
-            
-            popular_product_ids = [p['product_id'] for p in analytics['popular_products']]
-            recommendations = [p for p in products if p['id'] in popular_product_ids][:5]
-        else:
-            # Get products from user's order history
-            ordered_products = set()
-            for order in user_orders:
-                for item in order.get('items', []):
-                    ordered_products.add(item['product_id'])
-            
-            # Find products in same categories
-            products = load_json('products.json')
-            ordered_categories = set()
-            for product_id in ordered_products:
-                product = next((p for p in products if p['id'] == product_id), None)
-                if product:
-                    ordered_categories.add(product['category'])
-            
-            # Get recommendations from same categories
-            recommendations = []
-            for product in products:
-                if (product['id'] not in ordered_products and 
-                    product['category'] in ordered_categories):
-                    recommendations.append(product)
-            
-            # Limit to 5 recommendations
-            recommendations = recommendations[:5]
+        """Get personalized recommendations for user (precomputed per user)"""
+        product_map = load_json_cached('products.json', build_lookup)
+        
+        recommendations = [product_map[pid] for pid in get_user_recommendation_ids(user_id)
+                           if pid in product_map][:5]
         
         return jsonify({
             'success': True,
             'data': recommendations,
             'count': len(recommendations)
         }), 200
+    
+    @app.route('/api/recommendations/refresh', methods=['POST'])
+    @token_required
+    @admin_required
+    def refresh_recommendations(user_data):
+        """Rebuild co-purchase model and all user recommendation lists (Admin only)"""
+        rebuild_copurchase()
+        recs = refresh_all_user_recommendations()
+        
+        return jsonify({
+            'success': True,
+            'message': 'Recommendations refreshed successfully',
+            'data': {
+                'generated_at': recs['generated_at'],
+                'users': len(recs['users'])
+            }
+        }), 200
 
 # ============== BLOG/CONTENT MANAGEMENT ==============
 
@@ -904,9 +1080,9 @@ def blog_routes(app):
         if not post:
             return jsonify({'success': False, 'error': 'Post not found'}), 404
         
-        # Increment view count
-        post['views'] = post.get('views', 0) + 1
-        save_json('blog_posts.json', blog_posts)
+        # Views are buffered and flushed into blog_posts.json in the background
+        record_event('blog_view', post_id)
+        post['views'] = post.get('views', 0) + pending_count('blog_view', post_id)
         
         return jsonify({
             'success': True,
@@ -0,0 +1,133 @@
+"""
+Idempotency-Key support for POST endpoints
+Clients that retry a request with the same Idempotency-Key header get the
+stored response back instead of the work being done twice. Keys are scoped
+to the user and route and stored with a fingerprint of the request body, one
+row per key in a SQLite file in DATA_DIR shared by all workers, so claiming
+or completing a key only touches that key's row. Expired keys are pruned
+periodically and the oldest are evicted beyond IDEMPOTENCY_MAX_KEYS.
+"""
+
+import hashlib
+import json
+import time
+from functools import wraps
+
+from flask import jsonify, make_response, request
+
+from config import Config
+from utils import sqlite_connection
+
+IDEMPOTENCY_DB = 'idempotency_keys.sqlite3'
+PRUNE_EVERY = 500  # Claims per process between expiry/cap sweeps
+
+# A request that crashed mid-flight stops blocking retries after this long
+IN_PROGRESS_TIMEOUT = 60  # seconds
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    status INTEGER,
+    response TEXT,
+    created REAL NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idempotency_keys_created ON idempotency_keys (created);
+'''
+
+_calls = {'count': 0}
+
+
+def _connection():
+    return sqlite_connection(IDEMPOTENCY_DB, SCHEMA)
+
+
+def _fingerprint():
+    """Hash of what the request asks for, to catch keys reused for a different request"""
+    digest = hashlib.sha256()
+    digest.update(f'{request.method} {request.path}?{request.query_string.decode()}\n'.encode())
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+
+def _prune(conn, now):
+    conn.execute('DELETE FROM idempotency_keys WHERE expires <= ?', (now,))
+    conn.execute('DELETE FROM idempotency_keys WHERE key NOT IN '
+                 '(SELECT key FROM idempotency_keys ORDER BY created DESC LIMIT ?)',
+                 (Config.IDEMPOTENCY_MAX_KEYS,))
+
+
+def _claim(store_key, fingerprint):
+    """Claim a key for this request; returns the existing live row (status, response, fingerprint) or None"""
+    conn = _connection()
+    now = time.time()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = conn.execute('SELECT fingerprint, status, response FROM idempotency_keys '
+                           'WHERE key = ? AND expires > ?', (store_key, now)).fetchone()
+        if row is None:
+            # Claim the key before doing the work so concurrent retries wait for us
+            conn.execute('INSERT OR REPLACE INTO idempotency_keys VALUES (?, ?, NULL, NULL, ?, ?)',
+                         (store_key, fingerprint, now, now + IN_PROGRESS_TIMEOUT))
+            _calls['count'] += 1
+            if _calls['count'] % PRUNE_EVERY == 0:
+                _prune(conn, now)
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    return row
+
+
+def _complete(store_key, status, body):
+    now = time.time()
+    _connection().execute('UPDATE idempotency_keys SET status = ?, response = ?, expires = ? WHERE key = ?',
+                          (status, json.dumps(body), now + Config.IDEMPOTENCY_KEY_EXPIRES.total_seconds(),
+                           store_key))
+
+
+def _release(store_key):
+    _connection().execute('DELETE FROM idempotency_keys WHERE key = ?', (store_key,))
+
+
+def idempotent(f):
+    """Replay the stored response for a repeated Idempotency-Key (use after token_required)"""
+    @wraps(f)
+    def decorated(user_data, *args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return f(user_data, *args, **kwargs)
+
+        if len(key) > 255:
+            return jsonify({'success': False, 'error': 'Idempotency-Key must be at most 255 characters'}), 400
+
+        store_key = f"{user_data['id']}:{request.method}:{request.path}:{key}"
+        fingerprint = _fingerprint()
+
+        existing = _claim(store_key, fingerprint)
+        if existing:
+            stored_fingerprint, status, body = existing
+            if stored_fingerprint != fingerprint:
+                return jsonify({'success': False, 'error': 'Idempotency-Key was already used for a different request'}), 422
+            if status is None:
+                return jsonify({'success': False, 'error': 'A request with this Idempotency-Key is still being processed'}), 409
+
+            response = make_response(jsonify(json.loads(body)), status)
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+
+        try:
+            response = make_response(f(user_data, *args, **kwargs))
+        except Exception:
+            _release(store_key)
+            raise
+
+        # Server errors are not cached so the client can retry them
+        if response.status_code >= 500 or not response.is_json:
+            _release(store_key)
+        else:
+            _complete(store_key, response.status_code, response.get_json())
+        return response
+
+    return decorated
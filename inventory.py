@@ -0,0 +1,164 @@
+"""
+Inventory reservations for checkout
+Stock is checked and decremented inside one file_lock('products.json')
+critical section on freshly loaded data, so concurrent checkouts (threads or
+worker processes) can't both take the last unit. A reservation holds stock
+for a cart until it is committed by an order, released, or expires.
+"""
+
+import uuid
+from datetime import datetime
+
+from config import Config
+from utils import load_json, save_json, build_index, file_lock
+from change_log import record_changes
+from stats_store import adjust_stats, is_low_stock, stock_number
+
+RESERVATIONS_FILE = 'stock_reservations.json'
+
+
+def _load_reservations():
+    data = load_json(RESERVATIONS_FILE)
+    if not isinstance(data, dict):
+        return {}
+    for reservation in data.values():
+        reservation['items'] = {int(pid): qty for pid, qty in reservation['items'].items()}
+    return data
+
+
+def _restock(products, product_index, items, touched):
+    """Add {product_id: quantity} back to stock (products that still exist)
+
+    touched collects {product_id: stock before this operation}.
+    """
+    for product_id, quantity in items.items():
+        index = product_index.get(product_id)
+        if index is not None:
+            touched.setdefault(product_id, products[index].get('stock', 0))
+            products[index]['stock'] = stock_number(products[index].get('stock')) + quantity
+
+
+def _save_stock(products, product_index, touched):
+    """Save products.json, log each touched product's stock change and update low-stock stats"""
+    save_json('products.json', products)
+    record_changes([('product', pid, 'stock', products[product_index[pid]])
+                    for pid in sorted(touched)])
+    low_stock_delta = sum(is_low_stock(products[product_index[pid]].get('stock', 0)) - is_low_stock(old)
+                          for pid, old in touched.items())
+    adjust_stats(low_stock_products=low_stock_delta)
+
+
+def _release_expired(products, product_index, reservations, touched):
+    """Return stock held by expired reservations; True if anything changed"""
+    now = datetime.now().isoformat()
+    expired = [rid for rid, r in reservations.items() if r['expires_at'] <= now]
+    for rid in expired:
+        _restock(products, product_index, reservations.pop(rid)['items'], touched)
+    return bool(expired)
+
+
+def reserve_stock(user_id, items, reservation_id=None):
+    """Hold stock for a cart ({product_id: quantity}) during checkout
+
+    Re-uses reservation_id if it belongs to the user and still matches the
+    cart; any other active reservation of the user is released first.
+    Returns (reservation, error).
+    """
+    with file_lock('products.json'):
+        products = load_json('products.json')
+        product_index = build_index(products)
+        reservations = _load_reservations()
+        touched = {}
+        changed = _release_expired(products, product_index, reservations, touched)
+
+        # Only products that still exist can be reserved
+        items = {pid: qty for pid, qty in items.items() if pid in product_index}
+
+        existing = reservations.get(reservation_id)
+        if existing and existing['user_id'] == user_id and existing['items'] == items:
+            # Held for another full period, so it can't lapse between checkout and commit
+            existing['expires_at'] = (datetime.now() + Config.STOCK_RESERVATION_EXPIRES).isoformat()
+            if changed:
+                _save_stock(products, product_index, touched)
+            save_json(RESERVATIONS_FILE, reservations)
+            return existing, None
+
+        for rid in [rid for rid, r in reservations.items() if r['user_id'] == user_id]:
+            _restock(products, product_index, reservations.pop(rid)['items'], touched)
+            changed = True
+
+        # Check every line before touching stock so a failure holds nothing
+        error = None
+        for product_id, quantity in items.items():
+            product = products[product_index[product_id]]
+            if stock_number(product.get('stock')) < quantity:
+                error = f'Insufficient stock for {product["name"]}'
+                break
+
+        reservation = None
+        if error is None:
+            for product_id, quantity in items.items():
+                touched.setdefault(product_id, products[product_index[product_id]]['stock'])
+                products[product_index[product_id]]['stock'] = stock_number(products[product_index[product_id]]['stock']) - quantity
+            now = datetime.now()
+            reservation = {
+                'id': uuid.uuid4().hex,
+                'user_id': user_id,
+                'items': items,
+                'created_at': now.isoformat(),
+                'expires_at': (now + Config.STOCK_RESERVATION_EXPIRES).isoformat()
+            }
+            reservations[reservation['id']] = reservation
+            changed = True
+
+        if changed:
+            _save_stock(products, product_index, touched)
+            save_json(RESERVATIONS_FILE, reservations)
+        return reservation, error
+
+
+def commit_reservation(reservation_id):
+    """Turn a reservation into a sale: the stock stays decremented
+
+    Returns False if the reservation is gone (expired and released, so its
+    stock is back on sale and must not be shipped).
+    """
+    with file_lock('products.json'):
+        reservations = _load_reservations()
+        if reservations.pop(reservation_id, None) is None:
+            return False
+        save_json(RESERVATIONS_FILE, reservations)
+        return True
+
+
+def release_reservation(user_id, reservation_id=None):
+    """Give back stock held by a user's reservation (any of theirs if no id); True if released"""
+    with file_lock('products.json'):
+        reservations = _load_reservations()
+        release_ids = [rid for rid, r in reservations.items()
+                       if r['user_id'] == user_id and reservation_id in (None, rid)]
+        if not release_ids:
+            return False
+
+        products = load_json('products.json')
+        product_index = build_index(products)
+        touched = {}
+        for rid in release_ids:
+            _restock(products, product_index, reservations.pop(rid)['items'], touched)
+        _save_stock(products, product_index, touched)
+        save_json(RESERVATIONS_FILE, reservations)
+        return True
+
+
+def restock_order(order):
+    """Return a cancelled order's items to stock"""
+    items = {}
+    for item in order['items']:
+        items[item['product_id']] = items.get(item['product_id'], 0) + item['quantity']
+
+    with file_lock('products.json'):
+        products = load_json('products.json')
+        product_index = build_index(products)
+        touched = {}
+        _restock(products, product_index, items, touched)
+        _save_stock(products, product_index, touched)
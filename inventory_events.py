@@ -0,0 +1,38 @@
+"""
+Background side effects of stock levels
+stock_index.py emits 'inventory.threshold_crossed' when a product drops into
+low stock or runs out; every admin gets a notification for it.
+"""
+
+from datetime import datetime
+
+from tasks import subscribe
+from user_store import load_users
+from utils import load_json, save_json, locked, get_next_id
+
+ALERT_TITLES = {
+    'low': 'Low Stock',
+    'out': 'Out of Stock'
+}
+
+
+@subscribe('inventory.threshold_crossed')
+@locked('notifications.json')
+def notify_admins_low_stock(payload):
+    title = ALERT_TITLES.get(payload['level'])
+    if not title:
+        return  # Back above the threshold
+
+    notifications = load_json('notifications.json')
+    message = f"{payload['name']} (#{payload['product_id']}) is down to {payload['new_stock']} in stock."
+    for admin in [u for u in load_users() if u.get('is_admin')]:
+        notifications.append({
+            'id': get_next_id(notifications),
+            'user_id': admin['id'],
+            'type': 'low_stock',
+            'title': title,
+            'message': message,
+            'is_read': False,
+            'created_at': datetime.now().isoformat()
+        })
+    save_json('notifications.json', notifications)
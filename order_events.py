@@ -0,0 +1,101 @@
+"""
+Background side effects of order changes
+Routes only emit 'order.created' / 'order.status_changed' (see tasks.py); the
+handlers below run on the task queue so recommendation refreshes, customer
+notifications and popular-product counts stay off the request path. (Sales totals are kept
+by sales_rollups.py through order_store.index_order().)
+
+A job can be delivered more than once, so every non-repeatable side effect
+runs through tasks.once() keyed by event, order, new status (for status
+changes) and handler. Recommendation refreshes recompute from scratch and
+need no key.
+"""
+
+from datetime import datetime
+
+from tasks import subscribe, once
+from event_counters import record_event
+from utils import load_json, save_json, locked, get_next_id
+from recommendations import record_order_copurchase, remove_order_copurchase, refresh_user_recommendations
+
+STATUS_MESSAGES = {
+    'pending': 'Your order #{id} has been placed and is awaiting confirmation.',
+    'processing': 'Your order #{id} is being prepared.',
+    'shipped': 'Your order #{id} has been shipped and is on its way!',
+    'delivered': 'Your order #{id} has been delivered.',
+    'cancelled': 'Your order #{id} has been cancelled.'
+}
+
+
+@locked('notifications.json')
+def _notify(user_id, title, message):
+    notifications = load_json('notifications.json')
+    notifications.append({
+        'id': get_next_id(notifications),
+        'user_id': user_id,
+        'type': 'order_update',
+        'title': title,
+        'message': message,
+        'is_read': False,
+        'created_at': datetime.now().isoformat()
+    })
+    save_json('notifications.json', notifications)
+
+
+def _effect_key(event, order, handler):
+    # created_at tells apart orders that reuse an id after the data is cleared
+    return f"{event}:{order['id']}:{order.get('created_at')}:{handler}"
+
+
+def _record_order_events(order, kind):
+    for item in order['items']:
+        record_event(kind, item['product_id'], item['quantity'])
+
+
+# ============== ORDER CREATED ==============
+
+@subscribe('order.created')
+def update_recommendations_on_create(payload):
+    order = payload['order']
+    # A retry after a failed refresh must not count the order's pairs twice
+    once(_effect_key('order.created', order, 'copurchase'), record_order_copurchase, order)
+    refresh_user_recommendations(order['user_id'])
+
+
+@subscribe('order.created')
+def notify_order_created(payload):
+    order = payload['order']
+    once(_effect_key('order.created', order, 'notify'), _notify,
+         order['user_id'], 'Order Placed', STATUS_MESSAGES['pending'].format(id=order['id']))
+
+
+@subscribe('order.created')
+def count_ordered_products(payload):
+    order = payload['order']
+    once(_effect_key('order.created', order, 'count'), _record_order_events, order, 'product_order')
+
+
+# ============== ORDER STATUS CHANGED ==============
+# Status only moves forward, so (order id, new status) identifies one change
+
+@subscribe('order.status_changed')
+def update_recommendations_on_cancel(payload):
+    order = payload['order']
+    if order['status'] == 'cancelled':
+        once(_effect_key('order.status_changed', order, 'cancelled:copurchase'), remove_order_copurchase, order)
+        refresh_user_recommendations(order['user_id'])
+
+
+@subscribe('order.status_changed')
+def uncount_cancelled_products(payload):
+    order = payload['order']
+    if order['status'] == 'cancelled' and payload.get('previous_status') != 'cancelled':
+        once(_effect_key('order.status_changed', order, 'cancelled:count'), _record_order_events, order, 'product_cancel')
+
+
+@subscribe('order.status_changed')
+def notify_status_changed(payload):
+    order = payload['order']
+    message = STATUS_MESSAGES.get(order['status'], 'Your order #{id} is now ' + order['status'] + '.')
+    once(_effect_key('order.status_changed', order, order['status'] + ':notify'), _notify,
+         order['user_id'], 'Order Status Update', message.format(id=order['id']))
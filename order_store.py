@@ -0,0 +1,212 @@
+"""
+Order indexes
+Read-side indexes over orders.json, built once per file version and shared
+by every request until the file changes. Orders carry a numeric created_ts
+(epoch seconds) set at write time, so date-range queries are a binary search
+over a created_ts-sorted index instead of parsing every created_at.
+
+The status index (status -> sorted order ids, plus per-status counts), the
+order summaries used by list views and the sales rollups (sales_rollups.py)
+are kept in their own files and updated through index_order() by the
+handlers that write orders, under the orders.json lock.
+"""
+
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timezone
+
+from utils import load_json, save_json, load_json_cached, file_lock
+from stats_store import adjust_stats
+from sales_rollups import rollup_order, rebuild_sales_rollups
+
+
+def order_timestamp(value):
+    """Epoch seconds for a created_at datetime or ISO string
+
+    created_at values are naive wall-clock times; they are read as UTC so the
+    stored number doesn't depend on the server's timezone.
+    """
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _build_time_index(orders):
+    entries = sorted((o.get('created_ts') or order_timestamp(o['created_at']), i)
+                     for i, o in enumerate(orders))
+    return {
+        'orders': orders,
+        'timestamps': [ts for ts, _ in entries],
+        'positions': [i for _, i in entries]
+    }
+
+
+def orders_between(start_ts=None, end_ts=None, end_inclusive=True):
+    """Orders created in [start_ts, end_ts] (epoch seconds), oldest first
+
+    Returned orders are shared with the cache and must not be modified.
+    """
+    index = load_json_cached('orders.json', _build_time_index)
+    timestamps = index['timestamps']
+
+    lo = 0 if start_ts is None else bisect_left(timestamps, start_ts)
+    if end_ts is None:
+        hi = len(timestamps)
+    elif end_inclusive:
+        hi = bisect_right(timestamps, end_ts)
+    else:
+        hi = bisect_left(timestamps, end_ts)
+
+    orders = index['orders']
+    return [orders[i] for i in index['positions'][lo:hi]]
+
+
+def backfill_order_timestamps():
+    """Add created_ts to orders written before it existed"""
+    with file_lock('orders.json'):
+        orders = load_json('orders.json')
+        missing = [o for o in orders if 'created_ts' not in o]
+        for order in missing:
+            order['created_ts'] = order_timestamp(order['created_at'])
+        if missing:
+            save_json('orders.json', orders)
+        return len(missing)
+
+
+# ============== STATUS INDEX ==============
+
+ORDER_STATUS_INDEX_FILE = 'order_status_index.json'
+
+
+def rebuild_order_status_index():
+    """Rebuild status -> order ids and per-status counts from orders.json"""
+    with file_lock('orders.json'):
+        ids = {}
+        for order in load_json('orders.json'):
+            ids.setdefault(order['status'], []).append(order['id'])
+        index = {
+            'ids': {status: sorted(order_ids) for status, order_ids in ids.items()},
+            'counts': {status: len(order_ids) for status, order_ids in ids.items()}
+        }
+        save_json(ORDER_STATUS_INDEX_FILE, index)
+        return index
+
+
+def _status_index():
+    index = load_json_cached(ORDER_STATUS_INDEX_FILE)
+    if not index:
+        index = rebuild_order_status_index()
+    return index
+
+
+def index_order_status(order_id, old_status, new_status):
+    """Move an order between status lists (old_status=None for a new order)"""
+    with file_lock('orders.json'):
+        index = load_json(ORDER_STATUS_INDEX_FILE)
+        if not index:
+            rebuild_order_status_index()
+            return
+
+        ids, counts = index['ids'], index['counts']
+        if old_status is not None and order_id in ids.get(old_status, []):
+            ids[old_status].remove(order_id)
+            counts[old_status] -= 1
+        insort(ids.setdefault(new_status, []), order_id)
+        counts[new_status] = counts.get(new_status, 0) + 1
+        save_json(ORDER_STATUS_INDEX_FILE, index)
+
+
+def order_ids_with_status(status):
+    """Sorted ids of orders currently in status"""
+    return _status_index()['ids'].get(status, [])
+
+
+def order_status_counts():
+    """{status: number of orders}"""
+    return _status_index()['counts']
+
+
+# ============== ORDER SUMMARIES ==============
+
+ORDER_SUMMARIES_FILE = 'order_summaries.json'
+
+
+def order_summary(order):
+    """Lightweight projection of an order for list views"""
+    return {
+        'id': order['id'],
+        'user_id': order['user_id'],
+        'status': order['status'],
+        'total_amount': order['total_amount'],
+        'item_count': len(order.get('items', [])),
+        'created_at': order['created_at']
+    }
+
+
+def rebuild_order_summaries():
+    """Rebuild every order summary from orders.json"""
+    with file_lock('orders.json'):
+        summaries = {order['id']: order_summary(order) for order in load_json('orders.json')}
+        save_json(ORDER_SUMMARIES_FILE, summaries)
+        return summaries
+
+
+def _upsert_order_summary(order):
+    with file_lock('orders.json'):
+        summaries = load_json(ORDER_SUMMARIES_FILE)
+        if not isinstance(summaries, dict):
+            rebuild_order_summaries()
+            return
+        summaries[str(order['id'])] = order_summary(order)
+        save_json(ORDER_SUMMARIES_FILE, summaries)
+
+
+def _decode_summaries(data):
+    if not isinstance(data, dict):
+        return None
+    summaries = sorted(data.values(), key=lambda s: s['id'])
+    return {'list': summaries, 'by_id': {s['id']: s for s in summaries}}
+
+
+def _summaries():
+    summaries = load_json_cached(ORDER_SUMMARIES_FILE, _decode_summaries)
+    if summaries is None:
+        summaries = _decode_summaries(rebuild_order_summaries())
+    return summaries
+
+
+def order_summaries():
+    """All order summaries, ordered by id (shared, read-only)"""
+    return _summaries()['list']
+
+
+def order_summary_map():
+    """{order_id: summary} (shared, read-only)"""
+    return _summaries()['by_id']
+
+
+# ============== MAINTENANCE ==============
+
+def index_order(order, old_status=None):
+    """Update every order index after order was created (old_status=None) or changed"""
+    with file_lock('orders.json'):
+        if order['status'] != old_status:
+            index_order_status(order['id'], old_status, order['status'])
+        _upsert_order_summary(order)
+        if order['status'] != old_status:
+            rollup_order(order, old_status)
+
+        # Revenue counts every order that isn't cancelled
+        was_counted = old_status is not None and old_status != 'cancelled'
+        is_counted = order['status'] != 'cancelled'
+        adjust_stats(total_orders=1 if old_status is None else 0,
+                     total_revenue=(is_counted - was_counted) * order['total_amount'])
+
+
+def rebuild_order_indexes():
+    """Rebuild all order indexes from orders.json (startup / after bulk edits)"""
+    with file_lock('orders.json'):
+        rebuild_order_status_index()
+        rebuild_order_summaries()
+        rebuild_sales_rollups()
@@ -0,0 +1,87 @@
+"""
+Password hashing front-end used by the routes
+PASSWORD_HASHER selects the scheme for new hashes: 'bcrypt' (auth_bcrypt.py,
+the default) or the legacy 'sha256' (auth.py). Stored hashes are verified by their
+own format, so both kinds keep working whichever scheme is selected, and
+needs_rehash() tells login when to upgrade a hash to the current scheme/cost.
+
+bcrypt runs in a bounded process pool so a login storm can't tie up every
+request thread. At most PASSWORD_POOL_MAX_PENDING hash jobs may be queued or
+running; beyond that PasswordHasherBusy is raised and the API answers 503.
+"""
+
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+import auth
+from config import Config
+
+
+class PasswordHasherBusy(Exception):
+    """The hashing pool is saturated; the client should retry later"""
+
+
+_pool = None
+_pool_guard = threading.Lock()
+_slots = threading.BoundedSemaphore(Config.PASSWORD_POOL_MAX_PENDING)
+
+
+def is_bcrypt_hash(hashed_password):
+    return hashed_password.startswith(('$2a$', '$2b$', '$2y$'))
+
+
+def hash_info(hashed_password):
+    """(algorithm, cost) of a stored hash; cost is None for SHA256"""
+    if is_bcrypt_hash(hashed_password):
+        return 'bcrypt', int(hashed_password[4:6])
+    return 'sha256', None
+
+
+def needs_rehash(hashed_password):
+    """True if the hash is weaker than what PASSWORD_HASHER would produce now"""
+    if Config.PASSWORD_HASHER != 'bcrypt':
+        return False  # Never downgrade bcrypt hashes to SHA256
+    algorithm, cost = hash_info(hashed_password)
+    return algorithm != 'bcrypt' or cost < Config.BCRYPT_ROUNDS
+
+
+def _get_pool():
+    global _pool
+    with _pool_guard:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=Config.PASSWORD_POOL_WORKERS)
+        return _pool
+
+
+def _run_in_pool(fn, *args):
+    """Run fn in the pool, or raise PasswordHasherBusy when the queue is full"""
+    if not _slots.acquire(blocking=False):
+        raise PasswordHasherBusy()
+    try:
+        future = _get_pool().submit(fn, *args)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+
+    try:
+        return future.result(timeout=Config.PASSWORD_HASH_TIMEOUT)
+    except TimeoutError:
+        future.cancel()
+        raise PasswordHasherBusy()
+
+
+def hash_password(password):
+    """Hash a new password with the configured scheme"""
+    if Config.PASSWORD_HASHER == 'bcrypt':
+        import auth_bcrypt
+        return _run_in_pool(auth_bcrypt.hash_password, password, Config.BCRYPT_ROUNDS)
+    return auth.hash_password(password)
+
+
+def verify_password(password, hashed_password):
+    """Verify a password against a stored SHA256 or bcrypt hash"""
+    if is_bcrypt_hash(hashed_password):
+        import auth_bcrypt
+        return _run_in_pool(auth_bcrypt.verify_password, password, hashed_password)
+    return auth.verify_password(password, hashed_password)
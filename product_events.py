@@ -0,0 +1,20 @@
+"""
+Background side effects of product deletions
+Deleting products (one or in bulk) emits 'products.deleted'; the handlers
+below drop the products from every cart and from the recommendation data.
+Both are plain removals, so running them again is harmless.
+"""
+
+from tasks import subscribe
+from cart_store import remove_products_from_carts
+from recommendations import remove_deleted_products
+
+
+@subscribe('products.deleted')
+def remove_from_carts(payload):
+    remove_products_from_carts(payload['product_ids'])
+
+
+@subscribe('products.deleted')
+def remove_from_recommendations(payload):
+    remove_deleted_products(payload['product_ids'])
@@ -0,0 +1,84 @@
+"""
+Token-bucket rate limiting for auth and write endpoints
+Buckets are keyed by route name plus user id (valid bearer token) or remote
+address, and live in a small SQLite file in DATA_DIR so every worker process
+on the host shares them. Limits come from Config.RATE_LIMITS as
+name -> (requests, per_seconds): a burst of `requests`, refilled evenly over
+`per_seconds`. Excess requests get 429 before the route touches any data file.
+"""
+
+import math
+import time
+from functools import wraps
+
+from flask import jsonify, request
+
+from auth_decorators import verify_token_cached
+from config import Config
+from utils import sqlite_connection
+
+RATE_LIMIT_DB = 'rate_limits.sqlite3'
+PRUNE_EVERY = 1000  # Calls per process between removals of idle buckets
+
+SCHEMA = ('CREATE TABLE IF NOT EXISTS buckets '
+          '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+
+_calls = {'count': 0}
+
+
+def take_token(key, capacity, refill_rate):
+    """Take one token from a bucket; returns seconds to wait (0 if allowed)"""
+    conn = sqlite_connection(RATE_LIMIT_DB, SCHEMA)
+    now = time.time()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+        tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * refill_rate)
+
+        wait = 0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / refill_rate
+
+        conn.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                     (key, tokens, now))
+
+        _calls['count'] += 1
+        if _calls['count'] % PRUNE_EVERY == 0:
+            # Idle long enough to have refilled completely: same as no row at all
+            conn.execute('DELETE FROM buckets WHERE updated < ?', (now - Config.RATE_LIMIT_IDLE_SECONDS,))
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    return wait
+
+
+def _client_key():
+    """User id for a valid bearer token, otherwise the remote address"""
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        payload = verify_token_cached(header[7:])
+        if payload:
+            return f"user:{payload['id']}"
+    return f'ip:{request.remote_addr}'
+
+
+def rate_limited(name):
+    """Decorator: apply Config.RATE_LIMITS[name] per client (place right under @app.route)"""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            limit = Config.RATE_LIMITS.get(name)
+            if Config.RATE_LIMIT_ENABLED and limit:
+                requests_allowed, per_seconds = limit
+                wait = take_token(f'{name}:{_client_key()}', requests_allowed, requests_allowed / per_seconds)
+                if wait:
+                    return jsonify({
+                        'success': False,
+                        'error': 'Too many requests, please try again later'
+                    }), 429, {'Retry-After': str(math.ceil(wait))}
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
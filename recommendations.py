@@ -0,0 +1,481 @@
+"""
+Co-purchase ("customers also bought") recommendation engine
+Sparse item-to-item co-purchase counts are kept in copurchase.json and
+updated incrementally as orders are created/cancelled. Each product's
+top neighbours are precomputed so serving is a single keyed read.
+
+Per-user recommendation lists are materialized in user_recommendations.json,
+refreshed for a user when they place/cancel an order and for everyone by the
+nightly job (Cleanup-Maintenance Scripts/refresh_recommendations.py).
+
+Content-based similarity (TF-IDF over name/description/category) covers new
+products without order history. Term counts are kept per product and only
+changed products are re-tokenized when products.json changes.
+"""
+
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+from datetime import datetime
+from itertools import chain
+
+import numpy as np
+
+from event_counters import popular_products
+from utils import load_json, save_json, load_json_cached, locked, build_index, build_lookup
+
+COPURCHASE_FILE = 'copurchase.json'
+TOP_K = 20  # Neighbours precomputed per product
+
+USER_RECS_FILE = 'user_recommendations.json'
+USER_RECS_LIMIT = 10  # Product ids stored per user
+
+
+def _order_products(order):
+    """Distinct product ids in an order"""
+    return sorted({item['product_id'] for item in order.get('items', [])})
+
+
+def _decode(data):
+    """Convert stored model (string keys) to int-keyed dicts"""
+    if not data:
+        return None
+    return {
+        'item_orders': {int(pid): n for pid, n in data['item_orders'].items()},
+        'counts': {int(pid): {int(other): c for other, c in row.items()}
+                   for pid, row in data['counts'].items()},
+        'top': {int(pid): [tuple(entry) for entry in top] for pid, top in data['top'].items()}
+    }
+
+
+def _save_model(model):
+    save_json(COPURCHASE_FILE, {
+        'item_orders': model['item_orders'],
+        'counts': model['counts'],
+        'top': {pid: [list(entry) for entry in top] for pid, top in model['top'].items()}
+    })
+
+
+def _similarity(pair_count, orders_i, orders_j):
+    """Cosine similarity between two products' order vectors"""
+    return round(pair_count / math.sqrt(orders_i * orders_j), 4)
+
+
+@locked(COPURCHASE_FILE)
+def rebuild_copurchase():
+    """Rebuild the whole co-purchase model from orders.json (vectorized with NumPy)"""
+    orders = [o for o in load_json('orders.json') if o.get('status') != 'cancelled']
+    # Deleted products stay in old orders but are no longer recommended
+    existing = {p['id'] for p in load_json('products.json')}
+    baskets = [b for b in ([pid for pid in _order_products(o) if pid in existing] for o in orders) if b]
+
+    model = {'item_orders': {}, 'counts': {}, 'top': {}}
+
+    if baskets:
+        product_ids = np.array(sorted(set(chain.from_iterable(baskets))), dtype=np.int64)
+        n = len(product_ids)
+
+        # Flat (order, product) incidence: one entry per basket line
+        sizes = np.array([len(b) for b in baskets], dtype=np.int64)
+        items = np.searchsorted(product_ids, np.fromiter(chain.from_iterable(baskets), dtype=np.int64))
+        order_starts = np.cumsum(sizes) - sizes
+
+        # Self-join every entry with all entries of the same order
+        entry_sizes = np.repeat(sizes, sizes)
+        left = np.repeat(np.arange(items.size), entry_sizes)
+        offsets = np.arange(left.size) - np.repeat(np.cumsum(entry_sizes) - entry_sizes, entry_sizes)
+        right = np.repeat(np.repeat(order_starts, sizes), entry_sizes) + offsets
+        mask = left != right
+
+        codes = items[left[mask]] * n + items[right[mask]]
+        pairs, pair_counts = np.unique(codes, return_counts=True)
+        rows, cols = np.divmod(pairs, n)
+
+        item_counts = np.bincount(items, minlength=n)
+        scores = np.round(pair_counts / np.sqrt(item_counts[rows] * item_counts[cols]), 4)
+
+        # Rank neighbours inside each row: score desc, then product id asc
+        order = np.lexsort((cols, -scores, rows))
+        rows, cols, scores, pair_counts = rows[order], cols[order], scores[order], pair_counts[order]
+        rank = np.arange(rows.size) - np.searchsorted(rows, rows)
+
+        model['item_orders'] = {int(product_ids[i]): int(c) for i, c in enumerate(item_counts)}
+        for r, c, count, score, k in zip(rows.tolist(), cols.tolist(), pair_counts.tolist(),
+                                         scores.tolist(), rank.tolist()):
+            pid, other = int(product_ids[r]), int(product_ids[c])
+            model['counts'].setdefault(pid, {})[other] = count
+            if k < TOP_K:
+                model['top'].setdefault(pid, []).append((other, score))
+
+    _save_model(model)
+    return model
+
+
+def _refresh_top(model, product_id):
+    """Recompute the precomputed neighbour list for one product"""
+    row = model['counts'].get(product_id)
+    if not row:
+        model['top'].pop(product_id, None)
+        return
+
+    orders_i = model['item_orders'][product_id]
+    scored = ((other, _similarity(c, orders_i, model['item_orders'][other])) for other, c in row.items())
+    model['top'][product_id] = heapq.nlargest(TOP_K, scored, key=lambda x: (x[1], -x[0]))
+
+
+@locked(COPURCHASE_FILE)
+def _apply_order(order, sign):
+    """Add (sign=1) or remove (sign=-1) an order's basket from the model"""
+    basket = _order_products(order)
+    if not basket:
+        return
+
+    model = _decode(load_json(COPURCHASE_FILE))
+    if model is None:
+        # First use: orders.json already reflects this change
+        rebuild_copurchase()
+        return
+
+    item_orders, counts = model['item_orders'], model['counts']
+    for pid in basket:
+        item_orders[pid] = item_orders.get(pid, 0) + sign
+        row = counts.setdefault(pid, {})
+        for other in basket:
+            if other != pid:
+                row[other] = row.get(other, 0) + sign
+                if row[other] <= 0:
+                    del row[other]
+        if item_orders[pid] <= 0:
+            del item_orders[pid]
+        if not row:
+            del counts[pid]
+
+    # Only products in the basket and their neighbours have changed scores
+    affected = set(basket)
+    for pid in basket:
+        affected.update(counts.get(pid, {}))
+    for pid in affected:
+        _refresh_top(model, pid)
+
+    _save_model(model)
+
+
+def record_order_copurchase(order):
+    """Add a newly created order to the co-purchase model"""
+    _apply_order(order, 1)
+
+
+def remove_order_copurchase(order):
+    """Remove a cancelled order from the co-purchase model"""
+    _apply_order(order, -1)
+
+
+@locked(COPURCHASE_FILE)
+def _remove_from_model(product_ids):
+    model = _decode(load_json(COPURCHASE_FILE))
+    if model is None:
+        return
+
+    product_ids = [pid for pid in product_ids if pid in model['item_orders']]
+    if not product_ids:
+        return
+
+    # Neighbours of a deleted product lose it from their rows and top lists
+    affected = set()
+    for pid in product_ids:
+        del model['item_orders'][pid]
+        model['top'].pop(pid, None)
+        for other in model['counts'].pop(pid, {}):
+            row = model['counts'].get(other, {})
+            row.pop(pid, None)
+            if not row:
+                model['counts'].pop(other, None)
+            affected.add(other)
+
+    for pid in affected - set(product_ids):
+        _refresh_top(model, pid)
+    _save_model(model)
+
+
+@locked(USER_RECS_FILE)
+def _remove_from_user_recs(product_ids):
+    recs = _decode_user_recs(load_json(USER_RECS_FILE))
+    if recs is None:
+        return
+
+    recs['popular'] = [pid for pid in recs['popular'] if pid not in product_ids]
+    for user_id, ids in list(recs['users'].items()):
+        kept = [pid for pid in ids if pid not in product_ids]
+        if kept:
+            recs['users'][user_id] = kept
+        else:
+            del recs['users'][user_id]
+    save_json(USER_RECS_FILE, recs)
+
+
+def remove_deleted_products(product_ids):
+    """Drop deleted products from the co-purchase model and the materialized user lists"""
+    product_ids = set(product_ids)
+    _remove_from_model(product_ids)
+    _remove_from_user_recs(product_ids)
+
+
+def _model():
+    model = load_json_cached(COPURCHASE_FILE, _decode)
+    if model is None:
+        model = rebuild_copurchase()
+    return model
+
+
+def also_bought(product_id, limit=TOP_K):
+    """Precomputed [(product_id, score)] most often bought together with product_id"""
+    return _model()['top'].get(product_id, [])[:limit]
+
+
+def recommend_for_products(product_ids, limit=5):
+    """Blend the also-bought lists of several products, excluding the products themselves"""
+    top = _model()['top']
+    scores = {}
+    for pid in product_ids:
+        for other, score in top.get(pid, []):
+            if other not in product_ids:
+                scores[other] = scores.get(other, 0) + score
+    ranked = heapq.nlargest(limit, scores.items(), key=lambda x: (x[1], -x[0]))
+    return [pid for pid, _ in ranked]
+
+
+# ============== PER-USER MATERIALIZED LISTS ==============
+
+def _user_recommendation_ids(user_orders, products, product_index):
+    """Compute one user's recommendation list from their (non-cancelled) orders"""
+    ordered = {item['product_id'] for o in user_orders for item in o.get('items', [])}
+    if not ordered:
+        return []
+
+    # Customers who bought the same products also bought...
+    ids = [pid for pid in recommend_for_products(ordered, limit=USER_RECS_LIMIT * 2)
+           if pid in product_index][:USER_RECS_LIMIT]
+
+    # Fill remaining slots from the same categories
+    categories = {products[product_index[pid]]['category'] for pid in ordered if pid in product_index}
+    seen = ordered | set(ids)
+    for product in products:
+        if len(ids) >= USER_RECS_LIMIT:
+            break
+        if product['id'] not in seen and product['category'] in categories:
+            ids.append(product['id'])
+    return ids
+
+
+def _popular_ids(product_ids):
+    """Fallback list for users without order history (live top viewed/ordered products)"""
+    return [p['product_id'] for p in popular_products(limit=None)
+            if p['product_id'] in product_ids][:USER_RECS_LIMIT]
+
+
+def _decode_user_recs(data):
+    if not data:
+        return None
+    return {
+        'generated_at': data.get('generated_at'),
+        'popular': data.get('popular', []),
+        'users': {int(uid): ids for uid, ids in data.get('users', {}).items()}
+    }
+
+
+@locked(USER_RECS_FILE)
+def refresh_all_user_recommendations():
+    """Recompute every user's list (nightly job / first use)"""
+    products = load_json('products.json')
+    product_index = build_index(products)
+
+    orders_by_user = {}
+    for order in load_json('orders.json'):
+        if order.get('status') != 'cancelled':
+            orders_by_user.setdefault(order['user_id'], []).append(order)
+
+    users = {}
+    for user_id, user_orders in orders_by_user.items():
+        ids = _user_recommendation_ids(user_orders, products, product_index)
+        if ids:
+            users[user_id] = ids
+
+    data = {
+        'generated_at': datetime.now().isoformat(),
+        'popular': _popular_ids(product_index),
+        'users': users
+    }
+    save_json(USER_RECS_FILE, data)
+    return _decode_user_recs(data)
+
+
+@locked(USER_RECS_FILE)
+def refresh_user_recommendations(user_id):
+    """Recompute one user's list after they place or cancel an order"""
+    recs = _decode_user_recs(load_json(USER_RECS_FILE))
+    if recs is None:
+        refresh_all_user_recommendations()
+        return
+
+    products = load_json('products.json')
+    user_orders = [o for o in load_json('orders.json')
+                   if o['user_id'] == user_id and o.get('status') != 'cancelled']
+    ids = _user_recommendation_ids(user_orders, products, build_index(products))
+
+    if ids:
+        recs['users'][user_id] = ids
+    else:
+        recs['users'].pop(user_id, None)
+    save_json(USER_RECS_FILE, recs)
+
+
+def get_user_recommendation_ids(user_id):
+    """Materialized recommendation ids for a user (current popular products if none)"""
+    recs = load_json_cached(USER_RECS_FILE, _decode_user_recs)
+    if recs is None:
+        recs = refresh_all_user_recommendations()
+    if user_id in recs['users']:
+        return recs['users'][user_id]
+    return _popular_ids(load_json_cached('products.json', build_lookup))
+
+
+# ============== CONTENT-BASED (TF-IDF) ==============
+
+_STOP_WORDS = {'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is', 'it',
+               'of', 'on', 'or', 'that', 'the', 'this', 'to', 'with', 'your', 'you'}
+
+# Incrementally maintained state, synced lazily against products.json
+_tfidf = {
+    'products': None,    # products.json object the state was synced from
+    'signatures': {},    # product id -> (name, description, category)
+    'terms': {},         # product id -> Counter of terms
+    'df': Counter(),     # term -> number of products containing it
+    'index': None        # vectorized arrays, rebuilt after each sync
+}
+# Serializes syncs; readers only use the index object a sync returned, never mutated afterwards
+_tfidf_guard = threading.Lock()
+
+
+def _words(text):
+    # Anything but a string (null, a number from a bad update) has no words
+    return re.findall(r'[a-z0-9]+', text.lower()) if isinstance(text, str) else []
+
+
+def _tokenize(product):
+    """Terms for a product; name terms count double, category is one term"""
+    name = _words(product.get('name'))
+    description = _words(product.get('description'))
+    terms = Counter(t for t in name + name + description if len(t) > 1 and t not in _STOP_WORDS)
+    if isinstance(product.get('category'), str) and product['category']:
+        terms['category:' + product['category'].lower()] += 1
+    return terms
+
+
+def _build_tfidf_index(doc_terms):
+    """Vectorize per-product term counts into L2-normalised TF-IDF postings"""
+    ids = list(doc_terms)
+    vocab = {term: i for i, term in enumerate(_tfidf['df'])}
+
+    doc_idx, term_idx, tf = [], [], []
+    for d, pid in enumerate(ids):
+        for term, count in doc_terms[pid].items():
+            doc_idx.append(d)
+            term_idx.append(vocab[term])
+            tf.append(count)
+
+    doc_idx = np.array(doc_idx, dtype=np.int64)
+    term_idx = np.array(term_idx, dtype=np.int64)
+    df = np.array(list(_tfidf['df'].values()), dtype=np.float64)
+
+    # Smoothed idf and sublinear tf, then normalise each product vector
+    idf = np.log((1 + len(ids)) / (1 + df)) + 1
+    weights = (1 + np.log(np.array(tf, dtype=np.float64))) * idf[term_idx]
+    norms = np.sqrt(np.bincount(doc_idx, weights=weights ** 2, minlength=len(ids)))
+    weights /= norms[doc_idx]
+
+    # Postings grouped by term (for scoring) and by product (for the query vector)
+    by_term = np.argsort(term_idx, kind='stable')
+    return {
+        'ids': ids,
+        'position': {pid: d for d, pid in enumerate(ids)},
+        'doc_ptr': np.searchsorted(doc_idx, np.arange(len(ids) + 1)),
+        'doc_terms': term_idx,
+        'doc_weights': weights,
+        'term_ptr': np.searchsorted(term_idx[by_term], np.arange(len(vocab) + 1)),
+        'term_docs': doc_idx[by_term],
+        'term_weights': weights[by_term]
+    }
+
+
+def _sync_tfidf():
+    """Re-tokenize only products whose text changed since the last sync"""
+    products = load_json_cached('products.json')
+    if products is _tfidf['products']:
+        return _tfidf['index']
+
+    with _tfidf_guard:
+        if products is not _tfidf['products']:
+            _apply_product_changes(products)
+        return _tfidf['index']
+
+
+def _apply_product_changes(products):
+    """Bring terms/df up to date with products and swap in a new index (hold _tfidf_guard)"""
+    signatures, terms, df = _tfidf['signatures'], _tfidf['terms'], _tfidf['df']
+    current = set()
+    changed = False
+    for product in products:
+        pid = product['id']
+        current.add(pid)
+        signature = (product.get('name', ''), product.get('description', ''), product.get('category', ''))
+        if signatures.get(pid) == signature:
+            continue
+        if pid in terms:
+            df.subtract(terms[pid].keys())
+        signatures[pid] = signature
+        terms[pid] = _tokenize(product)
+        df.update(terms[pid].keys())
+        changed = True
+
+    for pid in set(terms) - current:
+        df.subtract(terms.pop(pid).keys())
+        del signatures[pid]
+        changed = True
+    for term in [t for t, n in df.items() if n <= 0]:
+        del df[term]
+
+    # Stock/price-only saves (every order) keep the current index
+    if changed:
+        _tfidf['index'] = _build_tfidf_index(terms) if terms else None
+    _tfidf['products'] = products
+
+
+def similar_products(product_id, limit=TOP_K):
+    """[(product_id, score)] with the most similar name/description/category (cosine)"""
+    index = _sync_tfidf()
+    if index is None or product_id not in index['position']:
+        return []
+
+    d = index['position'][product_id]
+    start, end = index['doc_ptr'][d], index['doc_ptr'][d + 1]
+    if start == end:
+        return []
+
+    # Dot product against every product sharing at least one term
+    docs, contributions = [], []
+    for term, weight in zip(index['doc_terms'][start:end], index['doc_weights'][start:end]):
+        t_start, t_end = index['term_ptr'][term], index['term_ptr'][term + 1]
+        docs.append(index['term_docs'][t_start:t_end])
+        contributions.append(index['term_weights'][t_start:t_end] * weight)
+    scores = np.bincount(np.concatenate(docs), weights=np.concatenate(contributions),
+                         minlength=len(index['ids']))
+    scores[d] = 0
+
+    k = min(limit, int(np.count_nonzero(scores)))
+    if k == 0:
+        return []
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.lexsort((top, -scores[top]))]
+    return [(index['ids'][i], round(float(scores[i]), 4)) for i in top]
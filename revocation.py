@@ -0,0 +1,180 @@
+"""
+Revoked token store (logout)
+Revoked jti claims are appended to revoked_tokens.jsonl, one {"jti", "exp"}
+line per logout. token_required checks every request against an in-memory
+Bloom filter first, so the common (not revoked) case never touches the exact
+set; a Bloom hit is confirmed against the exact set to rule out false
+positives.
+
+Each worker remembers how far it has read the log and only reads (and adds
+to the filter) the lines appended since. Once the log has doubled since its
+last compaction, the writer rewrites it with only the tokens that have not
+expired yet; workers notice the new file and reload it once.
+"""
+
+import hashlib
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+
+from config import Config
+from utils import file_lock
+
+REVOKED_FILE = 'revoked_tokens.jsonl'
+FALSE_POSITIVE_RATE = 0.01
+MIN_CAPACITY = 1024
+COMPACT_MIN_LINES = 1000  # Appended lines before the first compaction
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (k hashes by double hashing one SHA256)"""
+
+    def __init__(self, capacity, error_rate=FALSE_POSITIVE_RATE):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.sha256(key.encode()).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:16], 'big') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+# What this process has read of the log: file identity (inode), byte offset
+# and line count; base_lines is the line count right after the last compaction
+_state = {'inode': None, 'offset': 0, 'lines': 0, 'base_lines': 0,
+          'bloom': BloomFilter(MIN_CAPACITY), 'revoked': {}}
+_state_guard = threading.Lock()
+
+
+def _path():
+    return os.path.join(Config.DATA_DIR, REVOKED_FILE)
+
+
+def _bloom(revoked):
+    # Twice the current size leaves room for new revocations before the filter is rebuilt
+    bloom = BloomFilter(max(MIN_CAPACITY, 2 * len(revoked)))
+    for jti in revoked:
+        bloom.add(jti)
+    return bloom
+
+
+def _reset(inode, revoked=None):
+    revoked = revoked or {}
+    _state.update(inode=inode, offset=0, lines=len(revoked), base_lines=len(revoked),
+                  bloom=_bloom(revoked), revoked=revoked)
+
+
+def _add(jti, exp):
+    _state['revoked'][jti] = exp
+    if _state['bloom'].count >= _state['bloom'].capacity:
+        _state['bloom'] = _bloom(_state['revoked'])
+    else:
+        _state['bloom'].add(jti)
+
+
+def _catch_up():
+    """Read lines appended since the last read; start over if the log was compacted (hold _state_guard)"""
+    try:
+        f = open(_path(), 'rb')
+    except FileNotFoundError:
+        if _state['inode'] is not None:
+            _reset(None)
+        return
+
+    with f:
+        stat = os.fstat(f.fileno())
+        if stat.st_ino != _state['inode'] or stat.st_size < _state['offset']:
+            _reset(stat.st_ino)
+            reloading = True
+        else:
+            reloading = False
+
+        f.seek(_state['offset'])
+        for line in f:
+            if not line.endswith(b'\n'):
+                break  # Partially written line; picked up next time
+            entry = json.loads(line)
+            _add(entry['jti'], entry['exp'])
+            _state['offset'] += len(line)
+            _state['lines'] += 1
+        if reloading:
+            _state['base_lines'] = _state['lines']
+
+
+def _synced():
+    """Current state, caught up with revocations other workers appended"""
+    try:
+        stat = os.stat(_path())
+        current = (stat.st_ino, stat.st_size)
+    except FileNotFoundError:
+        current = (None, 0)
+    if current != (_state['inode'], _state['offset']):
+        with _state_guard:
+            _catch_up()
+    return _state
+
+
+def is_revoked(jti):
+    """True if the token id was revoked"""
+    state = _synced()
+    if jti not in state['bloom']:
+        return False
+    return jti in state['revoked']
+
+
+def _compact():
+    """Rewrite the log with only unexpired revocations (hold the file lock and _state_guard)"""
+    now = time.time()
+    live = {jti: exp for jti, exp in _state['revoked'].items() if exp > now}
+    fd, tmp_path = tempfile.mkstemp(dir=Config.DATA_DIR, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            for jti, exp in live.items():
+                f.write(json.dumps({'jti': jti, 'exp': exp}) + '\n')
+        os.replace(tmp_path, _path())
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    stat = os.stat(_path())
+    _reset(stat.st_ino, live)
+    _state['offset'] = stat.st_size
+
+
+def revoke_token(payload):
+    """Revoke a verified token payload (needs its jti); True if newly revoked"""
+    jti = payload.get('jti')
+    if not jti:
+        return False
+
+    with file_lock(REVOKED_FILE), _state_guard:
+        _catch_up()
+        if jti in _state['revoked']:
+            return False
+
+        exp = payload.get('exp', time.time() + Config.JWT_REFRESH_TOKEN_EXPIRES.total_seconds())
+        os.makedirs(Config.DATA_DIR, exist_ok=True)
+        with open(_path(), 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'jti': jti, 'exp': exp}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        _catch_up()
+
+        # Expired tokens fail verification anyway; drop them once the log has doubled
+        if _state['lines'] - _state['base_lines'] >= max(COMPACT_MIN_LINES, _state['base_lines']):
+            _compact()
+    return True
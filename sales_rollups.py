@@ -0,0 +1,166 @@
+"""
+Sales rollups by day, ISO week and month
+Each bucket holds the order count, revenue (non-cancelled orders),
+cancellations and a per-status breakdown for orders created in that period.
+The tables live in sales_rollups.json and are updated through
+order_store.index_order() as orders are created or change status, so sales
+reports over any range read a handful of buckets instead of every order.
+"""
+
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta, MAXYEAR
+
+from utils import load_json, save_json, load_json_cached, file_lock
+
+SALES_ROLLUPS_FILE = 'sales_rollups.json'
+UNITS = ('day', 'week', 'month')
+MAX_RANGE_DAYS = 3660
+# Last day a series may reach, so the period after it still fits in a date
+LAST_DAY = date(MAXYEAR - 1, 12, 31)
+
+
+def period_key(day, unit):
+    """Bucket key of a date: 2025-10-14, 2025-W42 or 2025-10"""
+    if unit == 'day':
+        return day.isoformat()
+    if unit == 'week':
+        year, week, _ = day.isocalendar()
+        return f'{year}-W{week:02d}'
+    return f'{day.year}-{day.month:02d}'
+
+
+def _period_start(day, unit):
+    if unit == 'week':
+        return day - timedelta(days=day.weekday())
+    if unit == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _next_period(start, unit):
+    if unit == 'week':
+        return start + timedelta(days=7)
+    if unit == 'month':
+        return date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start + timedelta(days=1)
+
+
+def empty_bucket():
+    return {'orders': 0, 'revenue': 0, 'cancelled': 0, 'by_status': {}}
+
+
+def _apply(bucket, status, amount, sign):
+    """Add (sign=1) or remove (sign=-1) one order in status"""
+    revenue = 0 if status == 'cancelled' else amount
+    bucket['orders'] += sign
+    bucket['revenue'] = round(bucket['revenue'] + sign * revenue, 2)
+    bucket['cancelled'] += sign if status == 'cancelled' else 0
+
+    entry = bucket['by_status'].setdefault(status, {'count': 0, 'revenue': 0})
+    entry['count'] += sign
+    entry['revenue'] = round(entry['revenue'] + sign * revenue, 2)
+    if entry['count'] <= 0:
+        del bucket['by_status'][status]
+
+
+def merge_bucket(total, bucket):
+    """Add bucket into total in place"""
+    total['orders'] += bucket['orders']
+    total['revenue'] = round(total['revenue'] + bucket['revenue'], 2)
+    total['cancelled'] += bucket['cancelled']
+    for status, entry in bucket['by_status'].items():
+        merged = total['by_status'].setdefault(status, {'count': 0, 'revenue': 0})
+        merged['count'] += entry['count']
+        merged['revenue'] = round(merged['revenue'] + entry['revenue'], 2)
+    return total
+
+
+def _order_day(order):
+    return date.fromisoformat(order['created_at'][:10])
+
+
+def rebuild_sales_rollups():
+    """Rebuild all rollup tables from orders.json"""
+    with file_lock('orders.json'):
+        rollups = {unit: {} for unit in UNITS}
+        for order in load_json('orders.json'):
+            day = _order_day(order)
+            for unit in UNITS:
+                bucket = rollups[unit].setdefault(period_key(day, unit), empty_bucket())
+                _apply(bucket, order['status'], order['total_amount'], 1)
+        save_json(SALES_ROLLUPS_FILE, rollups)
+        return rollups
+
+
+def rollup_order(order, old_status=None):
+    """Count a new order (old_status=None) or move it between statuses"""
+    with file_lock('orders.json'):
+        rollups = load_json(SALES_ROLLUPS_FILE)
+        if not isinstance(rollups, dict) or any(unit not in rollups for unit in UNITS):
+            rebuild_sales_rollups()
+            return
+
+        day = _order_day(order)
+        for unit in UNITS:
+            bucket = rollups[unit].setdefault(period_key(day, unit), empty_bucket())
+            if old_status is not None:
+                _apply(bucket, old_status, order['total_amount'], -1)
+            _apply(bucket, order['status'], order['total_amount'], 1)
+        save_json(SALES_ROLLUPS_FILE, rollups)
+
+
+def _decode(data):
+    if not isinstance(data, dict) or any(unit not in data for unit in UNITS):
+        return None
+    data['days'] = sorted(data['day'])
+    return data
+
+
+def _rollups():
+    rollups = load_json_cached(SALES_ROLLUPS_FILE, _decode)
+    if rollups is None:
+        rollups = _decode(rebuild_sales_rollups())
+    return rollups
+
+
+def _sum_days(rollups, first, last):
+    """Merge the day buckets in [first, last]"""
+    days = rollups['days']
+    total = empty_bucket()
+    for key in days[bisect_left(days, first.isoformat()):bisect_right(days, last.isoformat())]:
+        merge_bucket(total, rollups['day'][key])
+    return total
+
+
+def sales_series(unit, start=None, end=None):
+    """[(period key, bucket)] for every period from start to end (dates, inclusive)
+
+    Periods fully inside the range come straight from their rollup table;
+    partially covered edge periods are summed from day buckets. Raises
+    ValueError if the range is reversed or longer than MAX_RANGE_DAYS.
+    """
+    rollups = _rollups()
+    if not rollups['days']:
+        return []
+    start = start or date.fromisoformat(rollups['days'][0])
+    end = min(end or date.fromisoformat(rollups['days'][-1]), LAST_DAY)
+    if start > end or (end - start).days >= MAX_RANGE_DAYS:
+        raise ValueError(f'Date range must be between 1 and {MAX_RANGE_DAYS} days')
+
+    series = []
+    period = _period_start(start, unit)
+    while period <= end:
+        following = _next_period(period, unit)
+        key = period_key(period, unit)
+        if period >= start and following - timedelta(days=1) <= end:
+            bucket = rollups[unit].get(key) or empty_bucket()
+        else:
+            bucket = _sum_days(rollups, max(period, start), min(following - timedelta(days=1), end))
+        series.append((key, bucket))
+        period = following
+    return series
+
+
+def period_totals(unit, day):
+    """Bucket of the period containing day (e.g. this month's sales)"""
+    return _rollups()[unit].get(period_key(day, unit)) or empty_bucket()
@@ -0,0 +1,139 @@
+"""
+Fixed-size probabilistic counters
+HyperLogLog estimates distinct counts (unique visitors) and CountMinSketch
+estimates per-key counts (product views/orders) in constant memory however
+many keys are seen. Both merge losslessly (register max / cell sum), so each
+worker process can buffer its own and fold it into the persisted copy, and
+both serialize to a compact base64 string of their NumPy array.
+"""
+
+import base64
+import hashlib
+import heapq
+import math
+
+import numpy as np
+
+
+def _hash64(key, salt=b''):
+    return int.from_bytes(hashlib.blake2b(str(key).encode(), digest_size=8, salt=salt).digest(), 'big')
+
+
+def _encode(array):
+    return base64.b64encode(array.tobytes()).decode('ascii')
+
+
+def _decode(text, dtype):
+    return np.frombuffer(base64.b64decode(text), dtype=dtype).copy()
+
+
+class HyperLogLog:
+    """Distinct-count estimator with 2**precision one-byte registers (~1.04/sqrt(2**p) error)"""
+
+    def __init__(self, precision=11, registers=None):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = registers if registers is not None else np.zeros(self.m, dtype=np.uint8)
+
+    def add(self, key):
+        h = _hash64(key)
+        index = h >> (64 - self.precision)
+        rest = h & ((1 << (64 - self.precision)) - 1)
+        # Position of the first 1 bit in the remaining bits
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m ** 2 / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * self.m and zeros:
+            # Small cardinalities: linear counting is more accurate
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+    def to_json(self):
+        return _encode(self.registers)
+
+    @classmethod
+    def from_json(cls, text, precision=11):
+        return cls(precision, _decode(text, np.uint8))
+
+
+class CountMinSketch:
+    """Per-key count estimates (never under the true count for non-negative streams)
+
+    Estimates exceed the true count by at most ~e/width of the total with
+    probability 1 - exp(-depth). Counts are floats so the table can be decayed.
+    """
+
+    def __init__(self, width=2048, depth=4, table=None):
+        self.width = width
+        self.depth = depth
+        self.table = table if table is not None else np.zeros((depth, width), dtype=np.float32)
+
+    def _cells(self, key):
+        h1 = _hash64(key)
+        h2 = _hash64(key, salt=b'cms') | 1
+        return np.arange(self.depth), np.array([(h1 + i * h2) % self.width for i in range(self.depth)])
+
+    def add(self, key, count=1):
+        rows, columns = self._cells(key)
+        self.table[rows, columns] += count
+
+    def estimate(self, key):
+        rows, columns = self._cells(key)
+        return max(0.0, float(self.table[rows, columns].min()))
+
+    def merge(self, other):
+        self.table += other.table
+        return self
+
+    def scale(self, factor):
+        self.table *= factor
+        return self
+
+    def to_json(self):
+        return _encode(self.table)
+
+    @classmethod
+    def from_json(cls, text, width=2048, depth=4):
+        return cls(width, depth, _decode(text, np.float32).reshape(depth, width))
+
+
+class TopK:
+    """Heaviest keys of a CountMinSketch: candidates re-ranked by sketch estimate"""
+
+    def __init__(self, k, sketch=None, candidates=None):
+        self.k = k
+        self.sketch = sketch or CountMinSketch()
+        self.candidates = dict(candidates or {})
+
+    def add_counts(self, counts):
+        """Add {key: count} to the sketch and keep the k largest estimates"""
+        for key, count in counts.items():
+            self.sketch.add(key, count)
+        keys = set(self.candidates) | set(counts)
+        self.candidates = dict(heapq.nlargest(self.k, ((key, self.sketch.estimate(key)) for key in keys),
+                                              key=lambda item: item[1]))
+
+    def decay(self, factor):
+        self.sketch.scale(factor)
+        self.candidates = {key: count * factor for key, count in self.candidates.items()}
+
+    def top(self, limit=None):
+        """[(key, estimated count)], largest first"""
+        ranked = sorted(self.candidates.items(), key=lambda item: item[1], reverse=True)
+        return [item for item in ranked[:limit or self.k] if item[1] > 0]
+
+    def to_json(self):
+        return {'sketch': self.sketch.to_json(), 'candidates': self.candidates}
+
+    @classmethod
+    def from_json(cls, data, k):
+        return cls(k, CountMinSketch.from_json(data['sketch']), data['candidates'])
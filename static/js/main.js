@@ -215,6 +215,15 @@ function updateNavigation() {
 
 // Logout function
 function logout() {
+    const token = localStorage.getItem('token');
+    if (token) {
+        // Revoke the token server-side; keepalive lets the request finish during the redirect
+        fetch('/api/logout', {
+            method: 'POST',
+            headers: { 'Authorization': `Bearer ${token}` },
+            keepalive: true
+        }).catch(() => {});
+    }
     localStorage.removeItem('token');
     localStorage.removeItem('user');
     localStorage.removeItem('liked_products'); // Clear liked products on logout
@@ -320,11 +329,22 @@ function debounce(func, wait) {
     };
 }
 
+// Record a page view (buffered server-side; sendBeacon doesn't delay navigation)
+function trackPageView() {
+    const body = JSON.stringify({ type: 'page_view', path: window.location.pathname });
+    if (navigator.sendBeacon) {
+        navigator.sendBeacon('/api/events', body);
+    } else {
+        fetch('/api/events', { method: 'POST', body: body, keepalive: true }).catch(() => {});
+    }
+}
+
 // Initialize page
 document.addEventListener('DOMContentLoaded', function() {
     updateNavigation();
     updateCartCount();
     updateNotificationCount();
+    trackPageView();
     
     // Logout button handler
     const logoutBtn = document.getElementById('btn-logout');
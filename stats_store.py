@@ -0,0 +1,78 @@
+"""
+Materialized dashboard counters for /api/stats
+Totals (users, products, low-stock products, orders, revenue, reviews) are
+kept in stats_counters.json and adjusted by the handlers that change them, so
+reading the stats never loads the collections. rebuild_stats() recomputes
+everything from the data files (startup, after cascading deletes, and from
+Cleanup-Maintenance Scripts/rebuild_stats.py for repair).
+"""
+
+from datetime import datetime
+
+from utils import load_json, save_json, load_json_cached, file_lock
+
+STATS_FILE = 'stats_counters.json'
+LOW_STOCK_THRESHOLD = 10  # Products with stock below this count as low stock
+
+COUNTERS = ['total_users', 'total_products', 'low_stock_products',
+            'total_orders', 'total_revenue', 'total_reviews']
+
+
+def stock_number(stock):
+    """Numeric stock level; anything else (missing, null, a string) counts as 0"""
+    if isinstance(stock, (int, float)) and not isinstance(stock, bool):
+        return stock
+    return 0
+
+
+def is_low_stock(stock):
+    """1 if a stock level counts as low, else 0 (for counter deltas)"""
+    return 1 if stock_number(stock) < LOW_STOCK_THRESHOLD else 0
+
+
+def rebuild_stats():
+    """Recompute every counter from the data files"""
+    with file_lock(STATS_FILE):
+        products = load_json('products.json')
+        orders = load_json('orders.json')
+        stats = {
+            'total_users': len(load_json('users.json')),
+            'total_products': len(products),
+            'low_stock_products': sum(is_low_stock(p.get('stock', 0)) for p in products),
+            'total_orders': len(orders),
+            'total_revenue': round(sum(o['total_amount'] for o in orders if o['status'] != 'cancelled'), 2),
+            'total_reviews': len(load_json('reviews.json')),
+            'rebuilt_at': datetime.now().isoformat()
+        }
+        save_json(STATS_FILE, stats)
+        return stats
+
+
+def adjust_stats(**deltas):
+    """Add deltas to counters, e.g. adjust_stats(total_orders=1, total_revenue=99.5)
+
+    Call after the data change is saved: a missing counters file is rebuilt
+    from the data files instead, which already include the change.
+    """
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    with file_lock(STATS_FILE):
+        stats = load_json(STATS_FILE)
+        if not isinstance(stats, dict) or not all(name in stats for name in COUNTERS):
+            rebuild_stats()
+            return
+
+        for name, delta in deltas.items():
+            stats[name] += delta
+        stats['total_revenue'] = round(stats['total_revenue'], 2)
+        save_json(STATS_FILE, stats)
+
+
+def get_stats_counters():
+    """Current counters (shared, read-only)"""
+    stats = load_json_cached(STATS_FILE)
+    if not isinstance(stats, dict) or not all(name in stats for name in COUNTERS):
+        stats = rebuild_stats()
+    return stats
@@ -0,0 +1,136 @@
+"""
+Stock-ordered product index and low-stock alerts
+Products are kept as a sorted list of (stock, product id), so "everything at
+or below N" is one bisect plus a slice (O(log n + k)) for any threshold. The
+index follows products.json through the on_save hook: each save is diffed
+against the last known stock levels and only changed products are moved.
+A product whose stock crosses into low stock, out of stock or back to normal
+emits 'inventory.threshold_crossed' on the task queue (see inventory_events.py).
+Changes made by other processes or scripts are caught up on the next query,
+or just before the next save so that save is diffed against the file it
+replaces. The index is built at startup (rebuild_stock_index()).
+"""
+
+import logging
+import math
+import os
+import threading
+from bisect import bisect_right, insort
+
+from config import Config
+from stats_store import is_low_stock, stock_number
+from tasks import emit
+from utils import load_json, on_save, before_save
+
+PRODUCTS_FILE = 'products.json'
+
+# stock: product id -> stock as last indexed; entries: sorted (stock, product id)
+_index = {'version': None, 'stock': {}, 'entries': []}
+_index_guard = threading.RLock()
+
+logger = logging.getLogger(__name__)
+
+
+def stock_level(stock):
+    """'out', 'low' or 'ok'"""
+    if stock is None:
+        return None
+    if stock_number(stock) <= 0:
+        return 'out'
+    return 'low' if is_low_stock(stock) else 'ok'
+
+
+def _file_version():
+    try:
+        stat = os.stat(os.path.join(Config.DATA_DIR, PRODUCTS_FILE))
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _stock_map(products):
+    return {p['id']: stock_number(p.get('stock')) for p in products}
+
+
+def _rebuild(products, version):
+    stock = _stock_map(products)
+    _index.update(version=version, stock=stock,
+                  entries=sorted((level, pid) for pid, level in stock.items()))
+
+
+def _synced():
+    """The index, rebuilt first if products.json changed behind our back"""
+    with _index_guard:
+        version = _file_version()
+        if _index['version'] != version:
+            _rebuild(load_json(PRODUCTS_FILE), version)
+        return _index
+
+
+def rebuild_stock_index():
+    """Index products.json as it is on disk (app startup)"""
+    with _index_guard:
+        _rebuild(load_json(PRODUCTS_FILE), _file_version())
+
+
+def _before_products_saved():
+    """Catch up with changes made elsewhere while the file about to be replaced is still on disk"""
+    try:
+        _synced()
+    except Exception:
+        logger.exception('Stock index sync failed')
+
+
+def _on_products_saved(products):
+    """Move changed products in the index and emit threshold crossings"""
+    try:
+        crossings = _apply_save(products)
+    except Exception:
+        # The write itself already succeeded; rebuild on the next query instead
+        logger.exception('Stock index update failed')
+        with _index_guard:
+            _index['version'] = None
+        return
+
+    for crossing in crossings:
+        emit('inventory.threshold_crossed', crossing)
+
+
+def _apply_save(products):
+    crossings = []
+    with _index_guard:
+        if _index['version'] is None:
+            # Nothing indexed yet, so nothing to compare against
+            _rebuild(products, _file_version())
+            return crossings
+
+        old_stock, new_stock = _index['stock'], _stock_map(products)
+        entries = _index['entries']
+        names = None
+        for pid in old_stock.keys() | new_stock.keys():
+            old, new = old_stock.get(pid), new_stock.get(pid)
+            if old == new:
+                continue
+            if old is not None:
+                del entries[bisect_right(entries, (old, pid)) - 1]
+            if new is not None:
+                insort(entries, (new, pid))
+                if stock_level(new) != (stock_level(old) or 'ok'):
+                    if names is None:
+                        names = {p['id']: p.get('name') for p in products}
+                    crossings.append({'product_id': pid, 'name': names.get(pid), 'old_stock': old,
+                                      'new_stock': new, 'level': stock_level(new)})
+
+        _index.update(version=_file_version(), stock=new_stock)
+    return crossings
+
+
+before_save(PRODUCTS_FILE, _before_products_saved)
+on_save(PRODUCTS_FILE, _on_products_saved)
+
+
+def low_stock_ids(threshold):
+    """Ids of products with stock <= threshold, lowest stock first"""
+    with _index_guard:
+        entries = _synced()['entries']
+        return [pid for _, pid in entries[:bisect_right(entries, (threshold, math.inf))]]
@@ -0,0 +1,220 @@
+"""
+In-process background task queue
+Handlers subscribe to named events; emit() journals one job file per handler
+under task_queue/ before handing it to a thread pool, and the file is removed
+once the handler succeeds. Failed jobs are retried with backoff and then moved
+to task_queue/failed/. Jobs left behind by a crashed worker are picked up
+again at startup and then every TASK_RECOVERY_INTERVAL by a background
+thread, which also touches the files of this process's own jobs so that
+jobs still waiting in a live worker never look orphaned.
+
+emit(..., durable=False) skips the journal for payloads that must not be
+written to disk (e.g. a password to rehash): such jobs are still retried,
+but are lost, not recovered, if the worker dies.
+
+Delivery is at-least-once: a handler may run again after a retry or a
+recovery, so handlers wrap each side effect in once(key, ...), which skips
+effects already applied (keys live in task_effects.sqlite3).
+"""
+
+import logging
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from config import Config
+from utils import load_json, save_json, sqlite_connection
+
+QUEUE_DIR = 'task_queue'
+FAILED_DIR = os.path.join(QUEUE_DIR, 'failed')
+EFFECTS_DB = 'task_effects.sqlite3'
+
+EFFECTS_SCHEMA = ('CREATE TABLE IF NOT EXISTS applied_effects '
+                  '(key TEXT PRIMARY KEY, applied REAL NOT NULL)')
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}      # handler name -> function
+_subscribers = {}   # event -> [handler name]
+_executor = None
+_executor_guard = threading.Lock()
+_in_flight = set()  # job files this process has queued, running or waiting to retry
+_recovery_thread = None
+
+
+def subscribe(event):
+    """Decorator: run the function in the background with the payload of every emitted event"""
+    def decorator(f):
+        name = f'{f.__module__}.{f.__qualname__}'
+        _handlers[name] = f
+        _subscribers.setdefault(event, []).append(name)
+        return f
+    return decorator
+
+
+def _queue_path(filename):
+    return os.path.join(Config.DATA_DIR, QUEUE_DIR, filename)
+
+
+def _get_executor():
+    global _executor
+    with _executor_guard:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=Config.TASK_WORKERS, thread_name_prefix='task')
+        return _executor
+
+
+def _run(job):
+    """Run one job; retry with backoff, then park it in failed/"""
+    try:
+        _handlers[job['handler']](job['payload'])
+    except Exception:
+        job['attempts'] += 1
+        job['last_error'] = traceback.format_exc(limit=5)
+        durable = job.get('durable', True)
+        if job['attempts'] < Config.TASK_MAX_ATTEMPTS:
+            if durable:
+                save_json(os.path.join(QUEUE_DIR, job['file']), job)
+            timer = threading.Timer(2 ** job['attempts'], _submit, args=(job,))
+            timer.daemon = True
+            timer.start()
+            return
+        if durable:
+            save_json(os.path.join(FAILED_DIR, job['file']), job)
+        else:
+            logger.error('Task %s failed for good:\n%s', job['handler'], job['last_error'])
+
+    try:
+        os.remove(_queue_path(job['file']))
+    except FileNotFoundError:
+        pass
+    _in_flight.discard(job['file'])
+
+
+def _submit(job):
+    _in_flight.add(job['file'])
+    if Config.TASKS_ASYNC:
+        _get_executor().submit(_run, job)
+    else:
+        _run(job)
+
+
+def emit(event, payload, durable=True):
+    """Queue every subscriber of event with a JSON-serializable payload (journaled unless durable=False)"""
+    for name in _subscribers.get(event, []):
+        job_id = uuid.uuid4().hex
+        job = {
+            'id': job_id,
+            'file': f'{time.time_ns()}-{job_id}.json',
+            'event': event,
+            'handler': name,
+            'payload': payload,
+            'attempts': 0,
+            'created_at': datetime.now().isoformat()
+        }
+        # Journal first so a crash before the handler runs doesn't lose the job
+        if durable:
+            save_json(os.path.join(QUEUE_DIR, job['file']), job)
+        else:
+            job['durable'] = False
+        _submit(job)
+
+
+def once(key, effect, *args):
+    """Run effect(*args) unless a delivery of the same job already applied key; True if it ran
+
+    The key is recorded only after the effect succeeds, so a failed effect is
+    retried with the job.
+    """
+    conn = sqlite_connection(EFFECTS_DB, EFFECTS_SCHEMA)
+    if conn.execute('SELECT 1 FROM applied_effects WHERE key = ?', (key,)).fetchone():
+        return False
+    effect(*args)
+    conn.execute('INSERT OR IGNORE INTO applied_effects (key, applied) VALUES (?, ?)', (key, time.time()))
+    return True
+
+
+def _prune_effects():
+    cutoff = time.time() - Config.TASK_EFFECT_RETENTION.total_seconds()
+    sqlite_connection(EFFECTS_DB, EFFECTS_SCHEMA).execute('DELETE FROM applied_effects WHERE applied < ?', (cutoff,))
+
+
+def _renew_leases():
+    """Touch the files of jobs this process still holds so other workers don't recover them"""
+    for filename in list(_in_flight):
+        try:
+            os.utime(_queue_path(filename))
+        except FileNotFoundError:
+            pass
+
+
+def recover_pending_tasks():
+    """Re-queue jobs a crashed worker left behind; returns how many were claimed"""
+    queue_dir = os.path.join(Config.DATA_DIR, QUEUE_DIR)
+    if not os.path.isdir(queue_dir):
+        return 0
+
+    # Live workers keep touching their jobs, so only files idle this long are orphaned
+    cutoff = time.time() - Config.TASK_RECOVERY_AGE.total_seconds()
+    recovered = 0
+    for filename in sorted(os.listdir(queue_dir)):
+        path = os.path.join(queue_dir, filename)
+        if not filename.endswith('.json') or filename in _in_flight:
+            continue
+        try:
+            if os.path.getmtime(path) > cutoff:
+                continue
+        except FileNotFoundError:
+            continue  # Finished or claimed meanwhile
+
+        # Claim by renaming so only one worker picks the job up
+        claimed = f"{filename.split('.')[0]}.{os.getpid()}.json"
+        try:
+            os.rename(path, os.path.join(queue_dir, claimed))
+        except OSError:
+            continue
+
+        job = load_json(os.path.join(QUEUE_DIR, claimed))
+        if not job or job.get('handler') not in _handlers:
+            save_json(os.path.join(FAILED_DIR, claimed), job or {'file': claimed})
+            os.remove(os.path.join(queue_dir, claimed))
+            continue
+
+        job['file'] = claimed
+        _submit(job)
+        recovered += 1
+    return recovered
+
+
+def _recovery_loop():
+    while True:
+        time.sleep(Config.TASK_RECOVERY_INTERVAL.total_seconds())
+        try:
+            _renew_leases()
+            recover_pending_tasks()
+            _prune_effects()
+        except Exception:
+            logger.exception('Task recovery failed')
+
+
+def start_task_recovery():
+    """Recover orphaned jobs now, then keep checking in the background"""
+    global _recovery_thread
+    recovered = recover_pending_tasks()
+    if _recovery_thread is None:
+        _recovery_thread = threading.Thread(target=_recovery_loop, name='task-recovery', daemon=True)
+        _recovery_thread.start()
+    return recovered
+
+
+def wait_for_tasks():
+    """Block until queued jobs have run (shutdown / maintenance scripts)"""
+    global _executor
+    with _executor_guard:
+        executor, _executor = _executor, None
+    if executor:
+        executor.shutdown(wait=True)
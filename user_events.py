@@ -0,0 +1,36 @@
+"""
+Background side effects of logins
+Login emits 'user.rehash' (not journaled, the payload holds the password)
+when a verified password is stored with a weaker scheme or cost than
+PASSWORD_HASHER/BCRYPT_ROUNDS, so the bcrypt work and the users.json rewrite
+of the lazy migration stay off the login request. A busy hashing pool raises
+and the job is retried; a lost job just means the next login tries again.
+"""
+
+from datetime import datetime
+
+from tasks import subscribe
+from password_hashing import hash_password, hash_info, needs_rehash
+from user_store import get_user_by_id, find_user_position, save_users
+from utils import load_json, file_lock
+
+
+@subscribe('user.rehash')
+def upgrade_password_hash(payload):
+    # Skip if the password changed since login verified it, or an earlier job already upgraded it
+    user = get_user_by_id(payload['user_id'])
+    if not user or user['password'] != payload['verified_hash'] or not needs_rehash(user['password']):
+        return
+
+    new_hash = hash_password(payload['password'])
+
+    with file_lock('users.json'):
+        users = load_json('users.json')
+        user_index = find_user_position(payload['user_id'])
+        if user_index is None or users[user_index]['password'] != payload['verified_hash']:
+            return
+
+        users[user_index]['password'] = new_hash
+        users[user_index]['password_algorithm'], users[user_index]['password_cost'] = hash_info(new_hash)
+        users[user_index]['password_updated_at'] = datetime.now().isoformat()
+        save_users(users, updated=users[user_index])
@@ -0,0 +1,121 @@
+"""
+Users collection with id and email indexes
+Login, register and token refresh look users up by id or case-normalized
+email in O(1). The indexes are built once per users.json version and kept
+current incrementally when users are saved through save_users(); any other
+change to the file (another worker, a maintenance script) triggers a rebuild
+on the next lookup.
+"""
+
+import os
+import threading
+
+from config import Config
+from utils import load_json, save_json, build_index
+
+USERS_FILE = 'users.json'
+
+# users: users.json as last indexed; by_id / by_email map to positions in it
+_index = {'version': None, 'users': [], 'by_id': {}, 'by_email': {}}
+_index_guard = threading.RLock()
+
+
+# Stored with each user but never returned by the API
+PRIVATE_FIELDS = ('password', 'password_algorithm', 'password_cost')
+
+
+def public_user(user):
+    """Copy of a user record without password hash details, for responses"""
+    return {k: v for k, v in user.items() if k not in PRIVATE_FIELDS}
+
+
+def normalize_email(email):
+    """Emails are matched case-insensitively and without surrounding spaces (None if not a string)"""
+    if not isinstance(email, str):
+        return None
+    return email.strip().lower()
+
+
+def _file_version():
+    try:
+        stat = os.stat(os.path.join(Config.DATA_DIR, USERS_FILE))
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _index_emails(users):
+    by_email = {}
+    for position, user in enumerate(users):
+        # On legacy case-only duplicates the oldest account keeps the address
+        email = normalize_email(user.get('email'))
+        if email is not None:
+            by_email.setdefault(email, position)
+    return by_email
+
+
+def _synced():
+    """The index, rebuilt first if users.json changed behind our back"""
+    with _index_guard:
+        version = _file_version()
+        if _index['version'] != version:
+            users = load_json(USERS_FILE)
+            _index.update(version=version, users=users,
+                          by_id=build_index(users), by_email=_index_emails(users))
+        return _index
+
+
+def load_users():
+    """All users as of the current users.json (shared; treat as read-only)"""
+    return _synced()['users']
+
+
+def get_user_by_id(user_id):
+    """User record by id, or None (shared; treat as read-only)"""
+    index = _synced()
+    position = index['by_id'].get(user_id)
+    return index['users'][position] if position is not None else None
+
+
+def get_user_by_email(email):
+    """User record by case-normalized email, or None (shared; treat as read-only)"""
+    email = normalize_email(email)
+    if email is None:
+        return None
+    index = _synced()
+    position = index['by_email'].get(email)
+    return index['users'][position] if position is not None else None
+
+
+def find_user_position(user_id):
+    """Position of a user in users.json (hold file_lock('users.json') while using it)"""
+    return _synced()['by_id'].get(user_id)
+
+
+def save_users(users, added=None, updated=None):
+    """Save users.json and update the indexes for one added/updated user
+
+    Without added/updated (e.g. after a delete) the indexes are rebuilt lazily.
+    """
+    with _index_guard:
+        was_current = _index['version'] == _file_version()
+        save_json(USERS_FILE, users)
+
+        if not was_current or (added is None and updated is None):
+            _index['version'] = None
+            return
+
+        by_id, by_email = _index['by_id'], _index['by_email']
+        if added is not None:
+            position = len(users) - 1
+            by_id[added['id']] = position
+            by_email.setdefault(normalize_email(added['email']), position)
+        if updated is not None:
+            position = by_id[updated['id']]
+            old_email = normalize_email(_index['users'][position]['email'])
+            if by_email.get(old_email) == position:
+                del by_email[old_email]
+            by_email.setdefault(normalize_email(updated['email']), position)
+
+        _index['users'] = users
+        _index['version'] = _file_version()
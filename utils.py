@@ -1,9 +1,40 @@
 import json
 import os
 import re
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+from functools import wraps
 from config import Config
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 # How to do it (reusable helper functions)
 
+# Callbacks run after a data file is saved (derived caches / indexes hook in here)
+_save_listeners = {}
+# Callbacks run just before a save replaces the file (the old contents are still on disk)
+_before_save_listeners = {}
+
+# Parsed files keyed by (filename, decoder), reused until the file changes on disk
+_file_cache = {}
+
+# In-process side of file_lock(): one re-entrant lock per data file
+_file_locks = {}
+_file_locks_guard = threading.Lock()
+
+def on_save(filename, callback):
+    """Register a callback that runs with the new data every time filename is saved"""
+    _save_listeners.setdefault(filename, []).append(callback)
+
+def before_save(filename, callback):
+    """Register a callback that runs (without arguments) right before filename is replaced by a save"""
+    _before_save_listeners.setdefault(filename, []).append(callback)
+
 def load_json(filename):
     """Load data from JSON file"""
     filepath = os.path.join(Config.DATA_DIR, filename)
@@ -16,14 +47,115 @@ def load_json(filename):
     except json.JSONDecodeError:
         return []
 
+def load_json_cached(filename, decode=None):
+    """Load JSON data (optionally decoded) and reuse it until the file changes on disk
+
+    The returned object is shared between callers and must be treated as read-only.
+    """
+    filepath = os.path.join(Config.DATA_DIR, filename)
+
+    try:
+        stat = os.stat(filepath)
+        version = (stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        version = None
+
+    cache_key = (filename, decode)
+    cached = _file_cache.get(cache_key)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    data = load_json(filename)
+    if decode:
+        data = decode(data)
+    _file_cache[cache_key] = (version, data)
+    return data
+
 def save_json(filename, data):
     """Save data to JSON file"""
     filepath = os.path.join(Config.DATA_DIR, filename)
 
     os.makedirs(os.path.dirname(filepath), exist_ok=True)
 
-    with open(filepath, 'w') as f:
-        json.dump(data, f, indent=4)
+    # Write to a temp file and swap it in, so readers never see a half-written file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(filepath), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=4)
+        for callback in _before_save_listeners.get(filename, []):
+            callback()
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    # Invalidate anything derived from this file once per save
+    for cache_key in [k for k in _file_cache if k[0] == filename]:
+        del _file_cache[cache_key]
+    for callback in _save_listeners.get(filename, []):
+        callback(data)
+
+@contextmanager
+def file_lock(filename):
+    """Exclusive lock on a data file across threads and worker processes
+
+    Hold it around load_json -> modify -> save_json so concurrent writers
+    can't overwrite each other's changes. Re-entrant within a thread.
+    """
+    with _file_locks_guard:
+        entry = _file_locks.setdefault(filename, {'lock': threading.RLock(), 'depth': 0})
+
+    with entry['lock']:
+        entry['depth'] += 1
+        try:
+            if entry['depth'] > 1:
+                yield
+                return
+
+            lock_path = os.path.join(Config.DATA_DIR, filename + '.lock')
+            os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+            with open(lock_path, 'a+') as f:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                try:
+                    yield
+                finally:
+                    if fcntl:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+                    else:
+                        f.seek(0)
+                        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            entry['depth'] -= 1
+
+def locked(filename):
+    """Decorator: run the whole function under file_lock(filename)"""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            with file_lock(filename):
+                return f(*args, **kwargs)
+        return decorated
+    return decorator
+
+# Per-thread SQLite connections (sqlite3 connections aren't shareable between threads)
+_sqlite_local = threading.local()
+
+def sqlite_connection(filename, schema):
+    """This thread's autocommit connection to a SQLite file in DATA_DIR (WAL, schema applied once)"""
+    path = os.path.join(Config.DATA_DIR, filename)
+    connections = _sqlite_local.__dict__.setdefault('connections', {})
+    conn = connections.get(path)
+    if conn is None:
+        os.makedirs(Config.DATA_DIR, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(schema)
+        connections[path] = conn
+    return conn
 
 def get_next_id(data_list):
     """Get next available ID"""
@@ -31,11 +163,29 @@ def get_next_id(data_list):
         return 1
     return max(item['id'] for item in data_list) + 1
 
+def build_index(data_list, key='id'):
+    """Map key -> list position for O(1) lookups"""
+    return {item[key]: i for i, item in enumerate(data_list)}
+
+def build_lookup(data_list, key='id'):
+    """Map key -> item for O(1) lookups"""
+    return {item[key]: item for item in data_list}
+
 def validate_email(email):
     """Validate email format"""
+    if not isinstance(email, str):
+        return False
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
     return re.match(pattern, email) is not None
 
+def validate_id(value):
+    """Record ids are integers (not booleans)"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def validate_stock(stock):
+    """Stock levels are non-negative integers"""
+    return isinstance(stock, int) and not isinstance(stock, bool) and stock >= 0
+
 def load_fail_config():
     """Load fail configuration for testing"""
     try:
@@ -57,8 +207,11 @@ def apply_price_fail(total_price, fail_type='apitotalprice'):
 def cleanup_user_data(user_id):
     """Clean up all data associated with a user when they are deleted"""
     # List of all data files that contain user_id references
+    # Carts are stored per user
+    from cart_store import delete_cart
+    delete_cart(user_id)
+
     data_files_to_clean = [
-        'cart.json',          # Shopping cart items
         'orders.json',        # Order history
         'wishlist.json',      # Wishlist items
         'reviews.json',       # Product reviews